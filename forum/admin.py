@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Post, Profile, SubCategory, Topic,  Comment, Like
+from .models import Category, Post, Profile, SubCategory, Topic,  Comment, Like, Job
 
 
 # Register your models here.
@@ -10,3 +10,4 @@ admin.site.register(Topic)
 admin.site.register(Post)
 admin.site.register(Comment)
 admin.site.register(Like)
+admin.site.register(Job)
@@ -0,0 +1,156 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from django.template.response import TemplateResponse
+from django.utils.decorators import method_decorator
+from django.views.generic import View
+
+from .models import Topic, Post
+from .pagination import KeysetPaginator, MergedKeysetPaginator
+from . import likes, live, notifications
+from .fragments import post_blocks, apply_actions
+from .page_cache import versioned_cache_page, PAGE_CACHE_TIMEOUT
+from .taxonomy import registry
+
+# Async counterparts of the read-only views in views.py, routed instead of them
+# with FORUM_ASYNC_VIEWS = True. They render the same templates with the same
+# context and share the page and fragment caches. Under ASGI a request waiting
+# on the database does not hold a worker thread; the queries themselves are not
+# faster. Django runs async ORM calls one at a time on its single
+# thread-sensitive executor, so the reads grouped with asyncio.gather still
+# execute one after another.
+
+
+class AsyncHomepageView(View):
+    template_name = 'forum/homepage.html'
+    query_budget = 6
+    use_replica = True
+
+    @method_decorator(versioned_cache_page(PAGE_CACHE_TIMEOUT, lambda: ['homepage']))
+    async def dispatch(self, request, *args, **kwargs):
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        categories = await sync_to_async(registry.categories)()
+        return TemplateResponse(request, self.template_name, {'categories': categories, 'title': 'Головна сторінка'})
+
+
+class AsyncTopicListingMixin:
+    template_name = 'forum/category-topics.html'
+    paginate_by = 20
+
+    async def get_page(self, paginator):
+        page = await paginator.aget_page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        return {'topics': page.object_list, 'object_list': page.object_list, 'page_obj': page,
+                'is_paginated': page.has_other_pages()}
+
+
+class AsyncCategoryTopicsView(AsyncTopicListingMixin, View):
+    query_budget = 25
+    use_replica = True
+
+    @method_decorator(versioned_cache_page(PAGE_CACHE_TIMEOUT, lambda category_slug: [f'category:{category_slug}']))
+    async def dispatch(self, request, *args, **kwargs):
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request, category_slug):
+        category = await sync_to_async(registry.get_category_or_404)(category_slug)
+        # One range scan per subcategory, merged in Python.
+        parts = [Topic.objects.filter(subcategory_id=subcategory.id) for subcategory in category.subcategories]
+        context = await self.get_page(MergedKeysetPaginator(parts, Topic.LISTING_ORDERING, self.paginate_by))
+        context.update({
+            'title': f'Список обговорень {category.name}',
+            'category_title': category.name,
+            'breadcrumbs': await sync_to_async(registry.breadcrumbs)(category.slug),
+        })
+        return TemplateResponse(request, self.template_name, context)
+
+
+class AsyncSubcategoryTopicsView(AsyncTopicListingMixin, View):
+    query_budget = 8
+    use_replica = True
+
+    @method_decorator(versioned_cache_page(PAGE_CACHE_TIMEOUT,
+                                           lambda category_slug, subcategory_slug: [f'subcategory:{subcategory_slug}']))
+    async def dispatch(self, request, *args, **kwargs):
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request, category_slug, subcategory_slug):
+        subcategory = await sync_to_async(registry.get_subcategory_or_404)(subcategory_slug, category_slug)
+        paginator = KeysetPaginator(Topic.objects.filter(subcategory=subcategory), Topic.LISTING_ORDERING,
+                                    self.paginate_by)
+        context, user = await asyncio.gather(self.get_page(paginator), request.auser())
+        request.user = user
+        context.update({
+            'subscription': await notifications.aget_subscription(user, subcategory_id=subcategory.id),
+            'title': f'Список обговорень {subcategory.name}',
+            'category_title': subcategory.name,
+            'category_slug': category_slug,
+            'subcategory_slug': subcategory.slug,
+            'breadcrumbs': await sync_to_async(registry.breadcrumbs)(category_slug, subcategory.slug),
+        })
+        return TemplateResponse(request, self.template_name, context)
+
+
+class AsyncTopicView(View):
+    template_name = 'forum/topicview.html'
+    paginate_by = 10
+    query_budget = 12
+    use_replica = True
+
+    async def get(self, request, category_slug, subcategory_slug, topic_id):
+        subcategory = await sync_to_async(registry.get_subcategory_or_404)(subcategory_slug, category_slug)
+        posts = Post.objects.filter(topic_id=topic_id).select_related('author__profile')
+        paginator = KeysetPaginator(posts, ('-created_at', '-id'), self.paginate_by)
+
+        # The topic with its counters, the page of posts and the user do not depend on each other.
+        topic, page_obj, user = await asyncio.gather(
+            aget_object_or_404(Topic.objects.select_related('author__profile'), id=topic_id,
+                               subcategory_id=subcategory.id),
+            paginator.aget_page(after=request.GET.get('after'), before=request.GET.get('before')),
+            request.auser(),
+        )
+        request.user = user
+
+        # Cached post blocks (comments are only loaded for stale ones) and the user's likes.
+        post_ids = [post.id for post in page_obj.object_list]
+        blocks, liked_ids, subscription = await asyncio.gather(
+            sync_to_async(post_blocks)(page_obj.object_list),
+            likes.aliked_post_ids(user, post_ids),
+            notifications.aget_subscription(user, topic_id=topic.id),
+        )
+
+        context = {
+            'topic': topic,
+            'object': topic,
+            'breadcrumbs': await sync_to_async(registry.breadcrumbs)(category_slug, subcategory_slug),
+            'page_obj': page_obj,
+            'posts': page_obj.object_list,
+            'post_fragments': apply_actions(blocks, topic, request, likes.like_counts(page_obj.object_list),
+                                            liked_ids),
+            'subscription': subscription,
+        }
+        return TemplateResponse(request, self.template_name, context)
+
+
+class TopicEventsView(View):
+    """
+    Server-Sent Events stream of new posts ('post') and of posts that got a new
+    comment ('post-updated') in a topic. Under main/asgi.py the URL is served by
+    live.EventStreamRouter; this view is the fallback for plain Django ASGI
+    handlers. Under WSGI it answers 204, which tells EventSource not to reconnect.
+    """
+
+    async def get(self, request, category_slug, subcategory_slug, topic_id):
+        if not isinstance(request, ASGIRequest):
+            return HttpResponse(status=204)
+        subcategory = await sync_to_async(registry.get_subcategory_or_404)(subcategory_slug, category_slug)
+        if not await Topic.objects.filter(id=topic_id, subcategory_id=subcategory.id).aexists():
+            raise Http404('Обговорення не знайдено')
+        response = StreamingHttpResponse(live.event_stream(topic_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
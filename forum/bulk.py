@@ -0,0 +1,44 @@
+from contextlib import contextmanager
+from itertools import islice
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@contextmanager
+def preserve_timestamps(*models):
+    """
+    Let ``bulk_create`` keep the ``created_at``/``joined_date`` values set on the
+    objects instead of overwriting them with ``auto_now_add``. Only meant for
+    management commands, the switch is process wide while the block runs.
+    """
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def rebuild_derived_data():
+    """Recompute everything bulk inserts bypass: counters, the search index and cached taxonomy/pages."""
+    from . import counters, search
+    from .models import Category, SubCategory
+    from .page_cache import bump_page_groups
+    from .taxonomy import registry
+
+    counters.recount_topics()
+    counters.recount_post_likes()
+    counters.recount_post_comments()
+    counters.recount_user_activity()
+    search.rebuild_index()
+    registry.invalidate()
+    bump_page_groups('homepage',
+                     *(f'category:{slug}' for slug in Category.objects.values_list('slug', flat=True)),
+                     *(f'subcategory:{slug}' for slug in SubCategory.objects.values_list('slug', flat=True)))
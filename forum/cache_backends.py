@@ -0,0 +1,215 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Django creates one backend instance per thread, so the L1 state lives at module
+# level, keyed by alias, to be shared by all threads of the process.
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    """
+    Two-level cache: a bounded in-process LRU (L1) in front of a shared cache (L2).
+
+    Reads are served from L1 while its short TTL lasts and fall back to the
+    shared cache configured under ``OPTIONS['L2']``. Writes go to both tiers.
+    Keys starting with one of ``L1_BYPASS_PREFIXES`` (version, invalidation and
+    rate limit keys that other workers must see immediately) are never kept in L1.
+
+    Example::
+
+        'default': {
+            'BACKEND': 'forum.cache_backends.TieredCache',
+            'OPTIONS': {'L2': 'shared', 'L1_MAX_ENTRIES': 1000, 'L1_TIMEOUT': 5},
+        }
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    lock_stripes = 64
+
+    def __init__(self, name, params):
+        options = params.get('OPTIONS', {})
+        params = {**params, 'OPTIONS': {}}
+        super().__init__(params)
+        self._l2_alias = options.get('L2', 'shared')
+        self._l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self._l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self._bypass_prefixes = tuple(options.get('L1_BYPASS_PREFIXES', ('forum:version:', 'forum:ratelimit:')))
+        with _stores_lock:
+            store = _stores.setdefault(name, {
+                'l1': OrderedDict(),
+                'lock': threading.Lock(),
+                'flight_locks': [threading.Lock() for _ in range(self.lock_stripes)],
+                'stats': {'l1_hits': 0, 'l1_misses': 0, 'l2_hits': 0, 'l2_misses': 0},
+            })
+        self._l1 = store['l1']
+        self._lock = store['lock']
+        self._flight_locks = store['flight_locks']
+        self._stats = store['stats']
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'l1_entries': len(self._l1)}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _l1_allowed(self, key):
+        return not key.startswith(self._bypass_prefixes)
+
+    # L1 helpers work on the raw key, the L2 backend applies its own key function.
+
+    def _l1_get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._l1[key]
+                self._stats['l1_misses'] += 1
+                return False, None
+            self._l1.move_to_end(key)
+            self._stats['l1_hits'] += 1
+        return True, pickle.loads(entry[1])
+
+    def _l1_set(self, key, value, timeout):
+        if not self._l1_allowed(key):
+            return
+        ttl = self._l1_timeout
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None:
+            if timeout <= 0:
+                self._l1_delete(key)
+                return
+            ttl = min(ttl, timeout)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._lock:
+            self._l1[key] = (time.monotonic() + ttl, pickled)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def _cache_key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    def get(self, key, default=None, version=None):
+        full_key = self._cache_key(key, version)
+        if self._l1_allowed(key):
+            hit, value = self._l1_get(full_key)
+            if hit:
+                return value
+        sentinel = object()
+        value = self.l2.get(full_key, sentinel)
+        if value is sentinel:
+            self._count('l2_misses')
+            return default
+        self._count('l2_hits')
+        if self._l1_allowed(key):
+            self._l1_set(full_key, value, DEFAULT_TIMEOUT)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remaining = {}
+        for key in keys:
+            full_key = self._cache_key(key, version)
+            if self._l1_allowed(key):
+                hit, value = self._l1_get(full_key)
+                if hit:
+                    found[key] = value
+                    continue
+            remaining[full_key] = key
+        if remaining:
+            from_l2 = self.l2.get_many(remaining)
+            with self._lock:
+                self._stats['l2_hits'] += len(from_l2)
+                self._stats['l2_misses'] += len(remaining) - len(from_l2)
+            for full_key, value in from_l2.items():
+                key = remaining[full_key]
+                found[key] = value
+                if self._l1_allowed(key):
+                    self._l1_set(full_key, value, DEFAULT_TIMEOUT)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self._cache_key(key, version)
+        self.l2.set(full_key, value, timeout)
+        if self._l1_allowed(key):
+            self._l1_set(full_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        full_keys = {self._cache_key(key, version): key for key in data}
+        failed = self.l2.set_many({full_key: data[key] for full_key, key in full_keys.items()}, timeout)
+        for full_key, key in full_keys.items():
+            if self._l1_allowed(key) and full_key not in failed:
+                self._l1_set(full_key, data[key], timeout)
+        return [full_keys[full_key] for full_key in failed]
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self._cache_key(key, version)
+        added = self.l2.add(full_key, value, timeout)
+        if added and self._l1_allowed(key):
+            self._l1_set(full_key, value, timeout)
+        return added
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """
+        Single-flight get_or_set: concurrent misses for one key in this process
+        wait for a single computation of ``default`` instead of all running it.
+        """
+        sentinel = object()
+        value = self.get(key, sentinel, version=version)
+        if value is not sentinel:
+            return value
+        full_key = self._cache_key(key, version)
+        with self._flight_locks[hash(full_key) % self.lock_stripes]:
+            value = self.get(key, sentinel, version=version)
+            if value is not sentinel:
+                return value
+            if callable(default):
+                default = default()
+            self.set(key, default, timeout=timeout, version=version)
+            return default
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self._cache_key(key, version)
+        self._l1_delete(full_key)
+        return self.l2.touch(full_key, timeout)
+
+    def delete(self, key, version=None):
+        full_key = self._cache_key(key, version)
+        self._l1_delete(full_key)
+        return self.l2.delete(full_key)
+
+    def delete_many(self, keys, version=None):
+        full_keys = [self._cache_key(key, version) for key in keys]
+        for full_key in full_keys:
+            self._l1_delete(full_key)
+        self.l2.delete_many(full_keys)
+
+    def has_key(self, key, version=None):
+        sentinel = object()
+        return self.get(key, sentinel, version=version) is not sentinel
+
+    def incr(self, key, delta=1, version=None):
+        full_key = self._cache_key(key, version)
+        self._l1_delete(full_key)
+        return self.l2.incr(full_key, delta)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
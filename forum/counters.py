@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .bulk import chunked
+from .models import Topic, Post, Comment, Like, UserActivity, Notification
+
+
+def recount_topics(topics=None):
+    """Recompute every denormalized counter of ``topics`` (all topics by default) from the source rows."""
+    if topics is None:
+        topics = Topic.objects.all()
+
+    posts = Post.objects.filter(topic=OuterRef('pk'))
+    post_count = posts.order_by().values('topic').annotate(c=Count('id')).values('c')
+    comment_count = Comment.objects.filter(post__topic=OuterRef('pk'), post__deleted_at__isnull=True).order_by() \
+        .values('post__topic').annotate(c=Count('id')).values('c')
+    last_post = posts.order_by('-created_at', '-id')
+    last_comment = Comment.objects.filter(post__topic=OuterRef('pk'), post__deleted_at__isnull=True) \
+        .order_by('-created_at', '-id')
+
+    return topics.update(
+        post_count=Coalesce(Subquery(post_count), 0),
+        comment_count=Coalesce(Subquery(comment_count), 0),
+        last_post_at=Subquery(last_post.values('created_at')[:1]),
+        last_post_author=Subquery(last_post.values('author')[:1]),
+        # A new post or comment both bring the topic up in the listings.
+        last_activity_at=Greatest(Coalesce(Subquery(last_post.values('created_at')[:1]), F('created_at')),
+                                  Coalesce(Subquery(last_comment.values('created_at')[:1]), F('created_at'))),
+    )
+
+
+def recount_post_likes(posts=None):
+    """Recompute ``Post.like_count`` of ``posts`` (all posts by default) from the like rows."""
+    if posts is None:
+        posts = Post.objects.all()
+    like_count = Like.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(c=Count('id')).values('c')
+    return posts.update(like_count=Coalesce(Subquery(like_count), 0))
+
+
+def recount_post_comments(posts=None):
+    """Recompute ``Post.comment_count`` of ``posts`` (all posts by default) from the comment rows."""
+    if posts is None:
+        posts = Post.objects.all()
+    comment_count = Comment.objects.filter(post=OuterRef('pk')).order_by().values('post') \
+        .annotate(c=Count('id')).values('c')
+    return posts.update(comment_count=Coalesce(Subquery(comment_count), 0))
+
+
+def recount_user_activity(user_ids=None):
+    """
+    Recompute the activity summaries of ``user_ids`` (all users by default) from
+    the source rows, creating missing summaries. ``last_seen_at`` is not derived
+    data and is only filled from ``last_login`` when it is empty.
+    """
+    users = User.objects.all() if user_ids is None else User.objects.filter(pk__in=user_ids)
+    missing = users.filter(activity__isnull=True).values_list('pk', flat=True)
+    for chunk in chunked(missing.iterator(), 1000):
+        UserActivity.objects.bulk_create([UserActivity(user_id=user_id) for user_id in chunk], ignore_conflicts=True)
+
+    def count(model, **visible):
+        return model.objects.filter(author=OuterRef('user'), **visible).order_by().values('author') \
+            .annotate(c=Count('id')).values('c')
+
+    unread = Notification.objects.filter(user=OuterRef('user'), read_at__isnull=True).order_by().values('user') \
+        .annotate(c=Count('id')).values('c')
+    last_post = Post.objects.filter(author=OuterRef('user'), topic__deleted_at__isnull=True) \
+        .order_by('-created_at', '-id')
+    last_login = User.objects.filter(pk=OuterRef('user')).values('last_login')
+    summaries = UserActivity.objects.all() if user_ids is None else UserActivity.objects.filter(user__in=user_ids)
+    return summaries.update(
+        topic_count=Coalesce(Subquery(count(Topic)), 0),
+        post_count=Coalesce(Subquery(count(Post, topic__deleted_at__isnull=True)), 0),
+        comment_count=Coalesce(Subquery(count(Comment, post__deleted_at__isnull=True,
+                                              post__topic__deleted_at__isnull=True)), 0),
+        last_post_at=Subquery(last_post.values('created_at')[:1]),
+        last_post=Subquery(last_post.values('id')[:1]),
+        unread_count=Coalesce(Subquery(unread), 0),
+        last_seen_at=Coalesce(F('last_seen_at'), Subquery(last_login)),
+    )
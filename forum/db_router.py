@@ -0,0 +1,95 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Routing decision of the request being handled. Outside of requests (management
+# commands, background threads) there is none and everything uses the primary.
+_state = ContextVar('forum_db_routing', default=None)
+
+
+class RoutingState:
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+def begin_request():
+    return _state.set(RoutingState())
+
+
+def end_request(token):
+    _state.reset(token)
+
+
+def current_state():
+    return _state.get()
+
+
+def replica_aliases():
+    return list(getattr(settings, 'FORUM_DB_REPLICAS', ()))
+
+
+class ReplicaRouter:
+    """
+    Sends reads of views marked with ``use_replica = True`` to one of the
+    ``FORUM_DB_REPLICAS`` aliases and everything else to the primary. The
+    replica is chosen once per request; after the first write of a request its
+    remaining reads go to the primary as well. Sessions are always read from the
+    primary, a lagging replica would otherwise log fresh sessions out.
+    """
+
+    primary_only_apps = {'sessions'}
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if (state is not None and state.replica is not None and not state.wrote
+                and model._meta.app_label not in self.primary_only_apps):
+            return state.replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        mark_wrote()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+
+def mark_wrote():
+    state = _state.get()
+    if state is not None:
+        state.wrote = True
+
+
+def reading_replica():
+    state = _state.get()
+    return state is not None and state.replica is not None and not state.wrote
+
+
+@contextmanager
+def primary_reads():
+    """
+    Read from the primary inside the block. For whatever ends up in a shared
+    cache under the current version: rendered from a lagging replica, it would
+    stay stale there after the version was bumped for the newer rows.
+    """
+    state = _state.get()
+    replica = state.replica if state is not None else None
+    if replica is not None:
+        state.replica = None
+    try:
+        yield
+    finally:
+        if replica is not None:
+            state.replica = replica
+
+
+def choose_replica(state):
+    aliases = replica_aliases()
+    if aliases:
+        state.replica = random.choice(aliases)
@@ -0,0 +1,93 @@
+import datetime
+import json
+import zlib
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Topic, Post, Comment
+
+CHUNK_SIZE = 2000
+GZIP_BUFFER = 64 * 1024
+
+# Column order of every exported kind. Foreign keys use the names the importer
+# expects, so an export can be loaded again with import_forum.
+COLUMNS = {
+    'topic': (('id', 'id'), ('subcategory', 'subcategory_id'), ('author', 'author_id'), ('title', 'title'),
+              ('content', 'content'), ('created_at', 'created_at'), ('pinned', 'pinned')),
+    'post': (('id', 'id'), ('topic', 'topic_id'), ('author', 'author_id'), ('content', 'content'),
+             ('created_at', 'created_at')),
+    'comment': (('id', 'id'), ('post', 'post_id'), ('author', 'author_id'), ('content', 'content'),
+                ('created_at', 'created_at')),
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def parse_bound(value, end=False):
+    """Parse a date or datetime filter value, a bare end date includes that whole day."""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date: {value!r}')
+        parsed = datetime.datetime.combine(day + datetime.timedelta(days=1) if end else day, datetime.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+    return parsed
+
+
+def export_lines(subcategory=None, topic_id=None, since=None, until=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield one JSON line per topic, post and comment of the selected topics.
+
+    Rows are read as tuples with ``.iterator(chunk_size=...)`` and posts and
+    comments are selected through subqueries, so memory use does not depend on
+    the amount of exported data. ``since``/``until`` select topics by creation
+    time, their whole threads are exported.
+    """
+    topics = Topic.objects.order_by('id')
+    if subcategory is not None:
+        topics = topics.filter(subcategory=subcategory)
+    if topic_id is not None:
+        topics = topics.filter(id=topic_id)
+    if since is not None:
+        topics = topics.filter(created_at__gte=since)
+    if until is not None:
+        topics = topics.filter(created_at__lt=until)
+    posts = Post.objects.filter(topic__in=topics.values('id')).order_by('id')
+    comments = Comment.objects.filter(post__in=posts.values('id')).order_by('id')
+
+    for kind, queryset in (('topic', topics), ('post', posts), ('comment', comments)):
+        keys = [key for key, _ in COLUMNS[kind]]
+        rows = queryset.values_list(*(column for _, column in COLUMNS[kind])).iterator(chunk_size=chunk_size)
+        for row in rows:
+            record = {'type': kind, **dict(zip(keys, row))}
+            yield json.dumps(record, default=_json_default, ensure_ascii=False) + '\n'
+
+
+def encode(lines, compress=False):
+    """Turn exported lines into bytes chunks, optionally as one gzip stream."""
+    if not compress:
+        for line in lines:
+            yield line.encode()
+        return
+    compressor = zlib.compressobj(wbits=31)
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= GZIP_BUFFER:
+            chunk = compressor.compress(b''.join(buffer))
+            buffer, size = [], 0
+            if chunk:
+                yield chunk
+    yield compressor.compress(b''.join(buffer)) + compressor.flush()
@@ -0,0 +1,191 @@
+import re
+import uuid
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from .db_router import primary_reads, reading_replica
+from .models import Comment, Post
+from .pagination import KeysetPaginator
+
+
+# Rendered post blocks (post + its comments) are cached under the post id and a
+# version token, replaced whenever the post or one of its comments changes, so
+# stale HTML is simply never looked up again and expires on its own. Each block
+# is stored with the author versions of the users shown in it, bumped when one
+# of their ``AUTHOR_FIELDS`` changes, and is rendered again when they differ.
+POST_FRAGMENT_TIMEOUT = 60 * 60 * 24
+# Every profile field rendered by post-block.html and comment.html.
+AUTHOR_FIELDS = ('first_name', 'last_name')
+
+# A post block shows its first comments only, the rest is loaded on demand page by page.
+COMMENTS_PER_POST = 3
+COMMENT_PAGE_SIZE = 20
+COMMENT_ORDERING = ('created_at', 'id')
+
+ACTION_MARKER = re.compile(r'<!--(delete-post|delete-comment|reply|like|more-comments):([\d:]+)-->')
+
+
+def _version_key(post_id):
+    return f'forum:version:post:{post_id}'
+
+
+def _author_version_key(user_id):
+    return f'forum:version:author:{user_id}'
+
+
+def _fragment_key(post_id, version):
+    return f'forum:post:{post_id}:block:{version}'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def _bump_versions(keys):
+    if keys:
+        cache.set_many({key: _new_version() for key in keys}, None)
+
+
+def _get_versions(keys):
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {id_: found[key] for key, id_ in keys.items()}
+
+
+def bump_post_versions(post_ids):
+    _bump_versions({_version_key(post_id) for post_id in post_ids})
+
+
+def bump_author_versions(user_ids):
+    _bump_versions({_author_version_key(user_id) for user_id in user_ids})
+
+
+def get_post_versions(post_ids):
+    return _get_versions({_version_key(post_id): post_id for post_id in post_ids})
+
+
+def comment_paginator(post_id):
+    comments = Comment.objects.filter(post_id=post_id).select_related('author__profile')
+    return KeysetPaginator(comments, COMMENT_ORDERING, COMMENT_PAGE_SIZE)
+
+
+def attach_first_comments(posts):
+    """
+    Load the first ``COMMENTS_PER_POST`` comments of every post in one windowed
+    query and set ``first_comments``, ``hidden_comment_count`` and, when more
+    comments exist, ``more_comments_cursor`` on the posts.
+    """
+    by_post = {post.id: post for post in posts}
+    for post in posts:
+        post.first_comments = []
+    comments = Comment.objects.filter(post_id__in=by_post).annotate(
+        row=Window(RowNumber(), partition_by=[F('post_id')], order_by=[F('created_at').asc(), F('id').asc()]),
+    ).filter(row__lte=COMMENTS_PER_POST).select_related('author__profile').order_by('post_id', *COMMENT_ORDERING)
+    for comment in comments:
+        by_post[comment.post_id].first_comments.append(comment)
+    for post in posts:
+        post.hidden_comment_count = max(post.comment_count - len(post.first_comments), 0)
+        post.more_comments_cursor = None
+        if post.hidden_comment_count and post.first_comments:
+            post.more_comments_cursor = comment_paginator(post.id).encode_cursor(post.first_comments[-1])
+
+
+@lru_cache(maxsize=1)
+def _delete_button():
+    return render_to_string('forum/delete-button.html', {'url': '__URL__'})
+
+
+def _like_button(request, slugs, post_id, count, liked):
+    if not request.user.is_authenticated:
+        return f"<span class='like-count'>&#9825; {count}</span>"
+    url = reverse('unlike-post' if liked else 'like-post', args=(*slugs, post_id))
+    return (f"<form method='post' action='{url}' class='like-form'>"
+            f"<input type='hidden' name='csrfmiddlewaretoken' value='{get_token(request)}'>"
+            f"<button class='btn {'btn-success' if liked else 'btn-outline-success'}'>"
+            f"{'&#9829;' if liked else '&#9825;'} {count}</button></form>")
+
+
+def _apply_actions(html, topic, request, like_counts, liked_ids):
+    """Fill in the per-user buttons and the like counters left as markers in a cached post block."""
+    slugs = (topic.category_slug, topic.subcategory_slug, topic.id)
+    user = request.user
+
+    def replace(match):
+        action, args = match.group(1), [int(arg) for arg in match.group(2).split(':')]
+        if action == 'like':
+            return _like_button(request, slugs, args[0], like_counts.get(args[0], 0), args[0] in liked_ids)
+        if action == 'more-comments':
+            url = reverse('post-comments', args=(*slugs, args[0]))
+            return (f"<button class='btn btn-outline-light' data-url='{url}'>"
+                    f"Показати ще коментарі ({args[1]})</button>")
+        if action == 'reply':
+            if not user.is_authenticated:
+                return ''
+            url = reverse('create-comment', args=(*slugs, args[0]))
+            return f"<a href='{url}'><button class=\"btn btn-outline-warning\">Відповісти</button></a>"
+        if not (user.is_superuser or user.id == args[-1]):
+            return ''
+        if action == 'delete-post':
+            url = reverse('delete-post', args=(*slugs, args[0]))
+        else:
+            url = reverse('delete-comment', args=(*slugs, args[0], args[1]))
+        return _delete_button().replace('__URL__', url)
+
+    return ACTION_MARKER.sub(replace, html)
+
+
+def post_blocks(posts):
+    """
+    Return the cached HTML blocks of ``posts`` in order, rendering and loading
+    comments only for posts whose block is missing or outdated.
+    """
+    versions = get_post_versions([post.id for post in posts])
+    keys = {post.id: _fragment_key(post.id, versions[post.id]) for post in posts}
+    cached = cache.get_many(keys.values())
+    if cached:
+        # Blocks showing a user whose name changed since they were rendered are outdated too.
+        shown = {user_id for _, authors in cached.values() for user_id in authors}
+        current = _get_versions({_author_version_key(user_id): user_id for user_id in shown})
+        cached = {key: block for key, block in cached.items()
+                  if all(current[user_id] == version for user_id, version in block[1].items())}
+
+    missing = [post for post in posts if keys[post.id] not in cached]
+    if missing:
+        # Blocks are cached under the new version, so they are rendered from the primary.
+        replica_rows = reading_replica()
+        with primary_reads():
+            if replica_rows:
+                fresh_posts = Post.all_objects.select_related('author__profile') \
+                    .in_bulk([post.id for post in missing])
+                missing = [fresh_posts.get(post.id, post) for post in missing]
+            attach_first_comments(missing)
+        shown = {post.author_id for post in missing}
+        shown.update(comment.author_id for post in missing for comment in post.first_comments)
+        current = _get_versions({_author_version_key(user_id): user_id for user_id in shown})
+        fresh = {}
+        for post in missing:
+            authors = {post.author_id, *(comment.author_id for comment in post.first_comments)}
+            fresh[keys[post.id]] = (render_to_string('forum/post-block.html', {'post': post}),
+                                    {user_id: current[user_id] for user_id in authors})
+        cache.set_many(fresh, POST_FRAGMENT_TIMEOUT)
+        cached.update(fresh)
+    return [cached[keys[post.id]][0] for post in posts]
+
+
+def apply_actions(blocks, topic, request, like_counts=None, liked_ids=frozenset()):
+    like_counts = like_counts or {}
+    return [mark_safe(_apply_actions(block, topic, request, like_counts, liked_ids)) for block in blocks]
+
+
+def render_posts(posts, topic, request, like_counts=None, liked_ids=frozenset()):
+    return apply_actions(post_blocks(posts), topic, request, like_counts, liked_ids)
@@ -0,0 +1,181 @@
+import csv
+import datetime
+import json
+from collections import Counter
+from pathlib import Path
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from .models import Profile, Category, SubCategory, Topic, Post, Comment, ImportIdMap, ImportCheckpoint
+
+KINDS = ('user', 'category', 'subcategory', 'topic', 'post', 'comment')
+
+# CSV dumps hold one kind per file, recognised by the file name.
+FILE_KINDS = {'users': 'user', 'categories': 'category', 'subcategories': 'subcategory',
+              'topics': 'topic', 'posts': 'post', 'comments': 'comment'}
+
+# Foreign key columns of every kind and the kind their legacy ids point to.
+REFERENCES = {
+    'subcategory': {'category': 'category'},
+    'topic': {'subcategory': 'subcategory', 'author': 'user'},
+    'post': {'topic': 'topic', 'author': 'user'},
+    'comment': {'post': 'post', 'author': 'user'},
+}
+
+
+class ForumImportError(Exception):
+    pass
+
+
+def _datetime(value):
+    if not value:
+        return timezone.now()
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ForumImportError(f'Invalid datetime: {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+    return parsed
+
+
+class ForumImporter:
+    """
+    Streams a legacy dump into the forum tables.
+
+    Records are read one by one and inserted with ``bulk_create`` in batches of
+    one kind. Every batch runs in its own transaction together with its rows in
+    the id translation table and the file checkpoint, so an interrupted import
+    resumes after the last committed batch. Parents have to appear before
+    their children in the dump; records whose parents are unknown are skipped.
+    """
+
+    def __init__(self, source, batch_size=1000):
+        self.source = source
+        self.batch_size = batch_size
+        self.stats = Counter()
+        self._unusable_password = make_password(None)
+
+    def read(self, path, kind=None):
+        path = Path(path)
+        if path.suffix == '.csv':
+            kind = kind or FILE_KINDS.get(path.stem)
+            if kind not in KINDS:
+                raise ForumImportError(f'Can not tell the record type of {path}, pass it explicitly')
+            with path.open(newline='', encoding='utf-8') as file:
+                for line, record in enumerate(csv.DictReader(file), start=1):
+                    yield line, kind, record
+        else:
+            with path.open(encoding='utf-8') as file:
+                for line, raw in enumerate(file, start=1):
+                    if raw.strip():
+                        record = json.loads(raw)
+                        yield line, kind or record.pop('type'), record
+
+    def import_file(self, path, kind=None):
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=self.source, path=str(Path(path).resolve()))
+        batch, batch_kind, last_line = [], None, checkpoint.line
+        for line, record_kind, record in self.read(path, kind):
+            if line <= checkpoint.line:
+                continue
+            if record_kind not in KINDS:
+                raise ForumImportError(f'{path}:{line}: unknown record type {record_kind!r}')
+            if batch and (record_kind != batch_kind or len(batch) >= self.batch_size):
+                self._flush(batch_kind, batch, checkpoint, last_line)
+                batch = []
+            batch.append(record)
+            batch_kind, last_line = record_kind, line
+        if batch:
+            self._flush(batch_kind, batch, checkpoint, last_line)
+
+    def _map(self, kind, legacy_ids):
+        rows = ImportIdMap.objects.filter(source=self.source, kind=kind, legacy_id__in=legacy_ids)
+        return dict(rows.values_list('legacy_id', 'new_id'))
+
+    def _flush(self, kind, records, checkpoint, line):
+        with transaction.atomic():
+            done = self._map(kind, [str(record['id']) for record in records])
+            records = [record for record in records if str(record['id']) not in done]
+            self.stats[f'{kind}_already_imported'] += len(done)
+
+            refs = {}
+            for column, target in REFERENCES.get(kind, {}).items():
+                refs[column] = self._map(target, {str(record[column]) for record in records})
+            resolved = [record for record in records
+                        if all(str(record[column]) in mapping for column, mapping in refs.items())]
+            self.stats[f'{kind}_orphaned'] += len(records) - len(resolved)
+            for record in resolved:
+                for column, mapping in refs.items():
+                    record[column] = mapping[str(record[column])]
+
+            new_ids = getattr(self, f'_insert_{kind}')(resolved) if resolved else []
+            ImportIdMap.objects.bulk_create([
+                ImportIdMap(source=self.source, kind=kind, legacy_id=str(record['id']), new_id=new_id)
+                for record, new_id in zip(resolved, new_ids)])
+
+            checkpoint.line = line
+            checkpoint.save(update_fields=['line', 'updated_at'])
+        self.stats[kind] += len(resolved)
+
+    def _insert_user(self, records):
+        existing = dict(User.objects.filter(username__in=[record['username'] for record in records])
+                        .values_list('username', 'id'))
+        new_records = [record for record in records if record['username'] not in existing]
+        users = User.objects.bulk_create([
+            User(username=record['username'], email=record.get('email') or '',
+                 password=record.get('password') or self._unusable_password,
+                 date_joined=_datetime(record.get('date_joined')))
+            for record in new_records])
+        Profile.objects.bulk_create([
+            Profile(user=user, first_name=record.get('first_name') or None, last_name=record.get('last_name') or None,
+                    bio=record.get('bio') or 'Опис відсутній', filled=True, joined_date=user.date_joined.date())
+            for record, user in zip(new_records, users)])
+        existing.update((user.username, user.id) for user in users)
+        self.stats['user_matched_existing'] += len(records) - len(new_records)
+        return [existing[record['username']] for record in records]
+
+    def _insert_category(self, records):
+        categories = Category.objects.bulk_create([
+            Category(name=record['name'], slug=record.get('slug') or slugify(record['name']))
+            for record in records])
+        return [category.id for category in categories]
+
+    def _insert_subcategory(self, records):
+        category_slugs = dict(Category.objects.filter(id__in={record['category'] for record in records})
+                              .values_list('id', 'slug'))
+        subcategories = []
+        for record in records:
+            slug = record.get('slug') or slugify(record['name'])
+            subcategories.append(SubCategory(category_id=record['category'], name=record['name'], slug=slug,
+                                             slug_path=f"{category_slugs[record['category']]}/{slug}"))
+        return [subcategory.id for subcategory in SubCategory.objects.bulk_create(subcategories)]
+
+    def _insert_topic(self, records):
+        slug_paths = dict(SubCategory.objects.filter(id__in={record['subcategory'] for record in records})
+                          .values_list('id', 'slug_path'))
+        topics = []
+        for record in records:
+            created_at = _datetime(record.get('created_at'))
+            topics.append(Topic(subcategory_id=record['subcategory'], author_id=record['author'],
+                                title=record['title'], content=record['content'], created_at=created_at,
+                                last_activity_at=created_at, slug_path=slug_paths[record['subcategory']],
+                                pinned=str(record.get('pinned', '')).lower() in ('1', 'true')))
+        return [topic.id for topic in Topic.objects.bulk_create(topics)]
+
+    def _insert_post(self, records):
+        posts = Post.objects.bulk_create([
+            Post(topic_id=record['topic'], author_id=record['author'], content=record['content'],
+                 created_at=_datetime(record.get('created_at')))
+            for record in records])
+        return [post.id for post in posts]
+
+    def _insert_comment(self, records):
+        comments = Comment.objects.bulk_create([
+            Comment(post_id=record['post'], author_id=record['author'], content=record['content'],
+                    created_at=_datetime(record.get('created_at')))
+            for record in records])
+        return [comment.id for comment in comments]
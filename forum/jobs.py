@@ -0,0 +1,222 @@
+import itertools
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from . import writer
+from .models import Job
+
+logger = logging.getLogger('forum.jobs')
+
+BACKOFF_BASE = 5
+BACKOFF_MAX = 3600
+
+HANDLERS = {}
+
+
+class Handler:
+
+    def __init__(self, fn, max_attempts, atomic):
+        self.fn = fn
+        self.max_attempts = max_attempts
+        self.atomic = atomic
+
+
+def job(name, max_attempts=5, atomic=True):
+    """
+    Register the decorated function as the handler of jobs called ``name``.
+    Handlers get the job payload as keyword arguments and must be safe to run
+    more than once. An ``atomic`` handler runs in the transaction that marks
+    its job done; others (long, self-batching work) run outside of it.
+    """
+    def register(fn):
+        HANDLERS[name] = Handler(fn, max_attempts, atomic)
+        return fn
+    return register
+
+
+def enqueue(name, payload=None, key=None, delay=0):
+    enqueue_many([(name, payload, key)], delay)
+
+
+def enqueue_many(jobs, delay=0):
+    """
+    Store ``(name, payload, key)`` jobs, normally inside the transaction of the
+    write they belong to, so they are queued if and only if it commits. A job
+    whose ``key`` matches a job still waiting to run is dropped. With
+    ``FORUM_JOBS_EAGER = True`` the handlers run right after the commit instead.
+    """
+    if getattr(settings, 'FORUM_JOBS_EAGER', False):
+        for name, payload, _ in jobs:
+            transaction.on_commit(partial(run_eagerly, name, payload or {}))
+        return
+    run_at = timezone.now() + timedelta(seconds=delay)
+    Job.objects.bulk_create([
+        Job(name=name, payload=payload or {}, key=key, run_at=run_at, max_attempts=HANDLERS[name].max_attempts)
+        for name, payload, key in jobs], ignore_conflicts=True)
+
+
+def run_eagerly(name, payload):
+    handler = HANDLERS[name]
+    if handler.atomic:
+        writer.write(handler.fn, **payload)
+    else:
+        handler.fn(**payload)
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def queue_depth():
+    """Number of jobs per name and status."""
+    depth = {}
+    for row in Job.objects.values('name', 'status').annotate(count=Count('id')).order_by():
+        depth.setdefault(row['name'], {})[row['status']] = row['count']
+    return depth
+
+
+class JobStats:
+    """Per-job-type counters and timings of one worker process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._names = {}
+
+    def record(self, name, outcome, duration):
+        with self._lock:
+            stats = self._names.setdefault(name, {
+                'done': 0, 'retried': 0, 'failed': 0, 'time_ms': 0.0, 'max_ms': 0.0,
+            })
+            stats[outcome] += 1
+            stats['time_ms'] += duration * 1000
+            stats['max_ms'] = max(stats['max_ms'], duration * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started, 1e-9)
+            snapshot = {}
+            for name, stats in self._names.items():
+                runs = stats['done'] + stats['retried'] + stats['failed']
+                snapshot[name] = {**stats, 'jobs_per_second': round(stats['done'] / elapsed, 3),
+                                  'avg_ms': round(stats['time_ms'] / runs, 3), 'time_ms': round(stats['time_ms'], 3),
+                                  'max_ms': round(stats['max_ms'], 3)}
+            return snapshot
+
+
+class Worker:
+    """
+    Runs queued jobs on a thread pool.
+
+    Pending jobs are claimed with one UPDATE (so several workers never take
+    the same job), handed to the pool and marked done in the handler's
+    transaction. Failures are retried with exponential backoff until
+    ``max_attempts``, then kept as failed. Jobs left running by a dead worker
+    for longer than ``stale_after`` seconds are put back in the queue, and done
+    jobs are deleted ``keep_done`` seconds after they finished.
+    """
+
+    def __init__(self, threads=4, poll_interval=1.0, stale_after=600, keep_done=86400):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.keep_done = keep_done
+        self.name = f'{socket.gethostname()}:{os.getpid()}'[:48]
+        self.stats = JobStats()
+        self.stopping = threading.Event()
+        self._claims = itertools.count()
+        self._maintained_at = 0
+
+    def stop(self):
+        self.stopping.set()
+
+    def run(self, once=False):
+        """Process jobs until ``stop()`` is called or, with ``once``, until the queue has nothing due."""
+        running = set()
+        with ThreadPoolExecutor(self.threads, thread_name_prefix='forum-job') as pool:
+            while not self.stopping.is_set():
+                if time.monotonic() - self._maintained_at > 60:
+                    self.maintain()
+                jobs = self.claim(self.threads - len(running)) if len(running) < self.threads else []
+                running.update(pool.submit(self.execute, job) for job in jobs)
+                if once and not jobs and not running:
+                    break
+                if running:
+                    _, running = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                elif not jobs:
+                    self.stopping.wait(self.poll_interval)
+            wait(running)
+        close_old_connections()
+
+    def claim(self, limit):
+        token = f'{self.name}:{next(self._claims)}'
+        due = Job.objects.filter(status=Job.PENDING, run_at__lte=timezone.now()).order_by('run_at', 'id')
+        claimed = writer.write(lambda: Job.objects.filter(pk__in=due.values('pk')[:limit], status=Job.PENDING).update(
+            status=Job.RUNNING, claimed_by=token, claimed_at=timezone.now(), attempts=F('attempts') + 1))
+        return list(Job.objects.filter(claimed_by=token, status=Job.RUNNING).order_by('id')) if claimed else []
+
+    def execute(self, job):
+        close_old_connections()
+        start = time.perf_counter()
+        try:
+            handler = HANDLERS[job.name]
+            if handler.atomic:
+                writer.write(self._run, handler, job)
+            else:
+                handler.fn(**job.payload)
+                writer.write(self._finish, job)
+        except Exception:
+            error = traceback.format_exc()
+            logger.warning('Job %s failed (attempt %d of %d)', job, job.attempts, job.max_attempts, exc_info=True)
+            outcome = writer.write(self._fail, job, error)
+        else:
+            outcome = 'done'
+        finally:
+            close_old_connections()
+        self.stats.record(job.name, outcome, time.perf_counter() - start)
+
+    def _run(self, handler, job):
+        handler.fn(**job.payload)
+        self._finish(job)
+
+    def _finish(self, job):
+        Job.objects.filter(pk=job.pk).update(status=Job.DONE, finished_at=timezone.now(), last_error='')
+
+    def _fail(self, job, error):
+        if job.attempts >= job.max_attempts:
+            Job.objects.filter(pk=job.pk).update(status=Job.FAILED, finished_at=timezone.now(), last_error=error)
+            return 'failed'
+        self._requeue(job, run_at=timezone.now() + timedelta(seconds=backoff(job.attempts)), last_error=error)
+        return 'retried'
+
+    def _requeue(self, job, **changes):
+        try:
+            with transaction.atomic():
+                Job.objects.filter(pk=job.pk).update(status=Job.PENDING, **changes)
+        except IntegrityError:
+            # The same work was queued again meanwhile, keep both but only one holding the key.
+            Job.objects.filter(pk=job.pk).update(status=Job.PENDING, key=None, **changes)
+
+    def maintain(self):
+        self._maintained_at = time.monotonic()
+        now = timezone.now()
+        for stale in Job.objects.filter(status=Job.RUNNING, claimed_at__lt=now - timedelta(seconds=self.stale_after)):
+            logger.warning('Requeueing %s, claimed by %s at %s', stale, stale.claimed_by, stale.claimed_at)
+            writer.write(self._requeue, stale, run_at=now)
+        finished = Job.objects.filter(status=Job.DONE, finished_at__lt=now - timedelta(seconds=self.keep_done))
+        while ids := list(finished.values_list('pk', flat=True)[:1000]):
+            writer.write(lambda: Job.objects.filter(pk__in=ids).delete())
@@ -0,0 +1,141 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from . import writer
+from .models import Like, Post
+
+logger = logging.getLogger('forum.likes')
+
+
+class LikeCounterBuffer:
+    """
+    Write-behind aggregation of ``Post.like_count`` changes.
+
+    Like/unlike requests only insert or delete their ``Like`` row and add a
+    delta here. Deltas are summed per post and written with one UPDATE per post
+    when ``flush_threshold`` changes are pending or ``flush_interval`` seconds
+    after the first pending change, so a burst of likes on a hot post turns
+    into a single row update instead of a queue of requests waiting on its lock.
+
+    The counters are eventually consistent: a process adds its own pending
+    deltas to the counts it shows, but sees those of other processes only
+    once they are flushed. Flushes go through ``forum.writer``, and what is
+    still pending when the process exits is flushed then.
+    """
+
+    def __init__(self, flush_interval=2.0, flush_threshold=100):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._lock = threading.Lock()
+        self._deltas = defaultdict(int)
+        self._changes = 0
+        self._timer = None
+
+    def add(self, post_id, delta):
+        with self._lock:
+            self._deltas[post_id] += delta
+            self._changes += 1
+            flush_now = self._changes >= self.flush_threshold
+            if not flush_now and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            self.flush()
+
+    def pending(self, post_id):
+        with self._lock:
+            return self._deltas.get(post_id, 0)
+
+    def flush(self):
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(int)
+            self._changes = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        deltas = {post_id: delta for post_id, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+        try:
+            failed = writer.write(self._apply, deltas)
+        except Exception:
+            # Keep the deltas for the next flush rather than losing them.
+            self._keep(deltas)
+            raise
+        self._keep(failed)
+        return len(deltas) - len(failed)
+
+    def _keep(self, deltas):
+        with self._lock:
+            for post_id, delta in deltas.items():
+                self._deltas[post_id] += delta
+
+    def _apply(self, deltas):
+        # Every post in its own savepoint, so one failing row does not hold back the others.
+        # Counts are clamped at zero like in like_counts(), e.g. after recount_likes fixed the row.
+        failed = {}
+        for post_id, delta in sorted(deltas.items()):
+            try:
+                with transaction.atomic():
+                    Post.objects.filter(pk=post_id).update(like_count=Greatest(F('like_count') + delta, 0))
+            except DatabaseError:
+                logger.warning('Could not apply a like count delta of %d to post %d', delta, post_id, exc_info=True)
+                failed[post_id] = delta
+        return failed
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Could not flush pending like counts at exit, run recount_likes')
+
+
+like_buffer = LikeCounterBuffer()
+atexit.register(like_buffer.flush_at_exit)
+
+
+def like(user, post):
+    try:
+        with transaction.atomic():
+            Like.objects.create(user=user, post=post)
+    except IntegrityError:
+        return False
+    transaction.on_commit(lambda: like_buffer.add(post.id, 1))
+    return True
+
+
+def unlike(user, post):
+    deleted, _ = Like.objects.filter(user=user, post=post).delete()
+    if deleted:
+        transaction.on_commit(lambda: like_buffer.add(post.id, -1))
+    return bool(deleted)
+
+
+def like_counts(posts):
+    return {post.id: max(post.like_count + like_buffer.pending(post.id), 0) for post in posts}
+
+
+def liked_post_ids(user, post_ids):
+    if not user.is_authenticated or not post_ids:
+        return set()
+    return set(Like.objects.filter(user=user, post_id__in=post_ids).values_list('post_id', flat=True))
+
+
+async def aliked_post_ids(user, post_ids):
+    if not user.is_authenticated or not post_ids:
+        return set()
+    return {post_id async for post_id in Like.objects.filter(user=user, post_id__in=post_ids)
+            .values_list('post_id', flat=True)}
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from contextlib import suppress
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.urls import Resolver404, resolve, reverse
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+KEEPALIVE_INTERVAL = 15
+# Streams end after this many seconds and EventSource reconnects, so no
+# connection lives forever.
+STREAM_MAX_AGE = 300
+RETRY_MS = 3000
+
+
+class Subscription:
+    """One listener of a channel, fed by the broker from any thread."""
+
+    def __init__(self, broker, channel, max_pending):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_pending)
+
+    def deliver(self, message):
+        # A listener too slow to keep up loses messages instead of growing without bound.
+        if not self.queue.full():
+            self.queue.put_nowait(message)
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+class InProcessBroker:
+    """
+    Pub/sub between the views and the event streams of this worker process.
+
+    Subscribers are asyncio queues, so an idle subscriber costs a queue and a
+    suspended coroutine rather than a thread. ``publish`` may be called from
+    any thread, messages are handed to each subscriber's event loop. A broker
+    shared between processes (e.g. on top of Redis pub/sub) has to provide the
+    same ``subscribe``/``publish``/``has_subscribers`` methods and is selected
+    with ``FORUM_LIVE_BROKER``.
+    """
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, channel):
+        subscription = Subscription(self, channel, self.max_pending)
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def has_subscribers(self, channel):
+        return bool(self._subscriptions.get(channel))
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:
+                # The subscriber's event loop is already closed.
+                self.unsubscribe(subscription)
+        return len(subscriptions)
+
+
+broker = SimpleLazyObject(lambda: import_string(getattr(settings, 'FORUM_LIVE_BROKER',
+                                                        'forum.live.InProcessBroker'))())
+
+
+def topic_channel(topic_id):
+    return f'topic:{topic_id}'
+
+
+def _publish_post(event, post):
+    # Blocks carry per-viewer buttons, so listeners get the address of the
+    # block and fetch it rendered for themselves.
+    channel = topic_channel(post.topic_id)
+    if broker.has_subscribers(channel):
+        topic = post.topic
+        url = reverse('post-block', args=(topic.category_slug, topic.subcategory_slug, topic.id, post.id))
+        broker.publish(channel, {'event': event, 'data': {'id': post.id, 'url': url}})
+
+
+def post_created(post):
+    """Push the new post to the topic's listeners once the transaction commits."""
+    transaction.on_commit(lambda: _publish_post('post', post))
+
+
+def comment_created(comment):
+    """Push the updated block of the commented post once the transaction commits."""
+    transaction.on_commit(lambda: _publish_post('post-updated', comment.post))
+
+
+def format_event(message):
+    return f"event: {message['event']}\ndata: {json.dumps(message['data'], ensure_ascii=False)}\n\n"
+
+
+async def event_stream(topic_id):
+    """SSE body of a topic: a retry hint, then events and keepalive comments."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + STREAM_MAX_AGE
+    async with broker.subscribe(topic_channel(topic_id)) as subscription:
+        yield f'retry: {RETRY_MS}\n\n'
+        while loop.time() < deadline:
+            message = await subscription.get(KEEPALIVE_INTERVAL)
+            yield format_event(message) if message is not None else ': keepalive\n\n'
+
+
+def topic_exists(category_slug, subcategory_slug, topic_id):
+    from .models import Topic
+    from .taxonomy import registry
+
+    try:
+        subcategory = registry.get_subcategory(subcategory_slug, category_slug)
+        return subcategory is not None and Topic.objects.filter(id=topic_id, subcategory_id=subcategory.id).exists()
+    finally:
+        close_old_connections()
+
+
+class EventStreamRouter:
+    """
+    ASGI wrapper serving the 'topic-events' URL without Django's request cycle.
+
+    Django keeps a thread for every ASGI request that touched sync code until
+    its response is finished, which for a long-lived stream means a thread per
+    subscriber. Here only the existence check runs in the shared executor, the
+    stream itself is a coroutine. Every other request goes to ``application``.
+    """
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            match = self._match(scope)
+            if match is not None:
+                return await self.serve(match.kwargs, receive, send)
+        return await self.application(scope, receive, send)
+
+    def _match(self, scope):
+        path = scope['path']
+        root_path = scope.get('root_path', '')
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return None
+        return match if match.url_name == 'topic-events' else None
+
+    async def serve(self, kwargs, receive, send):
+        if not await sync_to_async(topic_exists, thread_sensitive=False)(**kwargs):
+            await send({'type': 'http.response.start', 'status': 404,
+                        'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+            await send({'type': 'http.response.body', 'body': b'Not Found'})
+            return
+
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        stream = event_stream(kwargs['topic_id'])
+        try:
+            while True:
+                chunk = asyncio.ensure_future(stream.__anext__())
+                await asyncio.wait({chunk, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not chunk.done():
+                    chunk.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await chunk
+                    break
+                try:
+                    body = chunk.result()
+                except StopAsyncIteration:
+                    await send({'type': 'http.response.body', 'body': b''})
+                    break
+                await send({'type': 'http.response.body', 'body': body.encode(), 'more_body': True})
+        finally:
+            disconnected.cancel()
+            await stream.aclose()
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
@@ -0,0 +1,163 @@
+import io
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from forum import urls as forum_urls
+from forum.models import Profile, Topic, Post, Comment
+
+# Routes that change data are driven with a POST that the next request reverts,
+# everything else (including create/delete confirmation forms) with a GET.
+POST_ROUTES = {
+    'like-post': 'unlike-post', 'unlike-post': 'like-post',
+    'subscribe-topic': 'unsubscribe-topic', 'unsubscribe-topic': 'subscribe-topic',
+    'subscribe-subcategory': 'unsubscribe-subcategory', 'unsubscribe-subcategory': 'subscribe-subcategory',
+}
+
+
+def bench_caches(scale):
+    """
+    The configured caches with every store replaced by a private in-memory one,
+    so a run neither reads nor wipes the caches of the live site. The tiered
+    front end is kept, it is part of what is measured.
+    """
+    isolated = {}
+    for alias, config in settings.CACHES.items():
+        if config['BACKEND'] == 'forum.cache_backends.TieredCache':
+            isolated[alias] = config
+        else:
+            isolated[alias] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                               'LOCATION': f'forum-bench-{alias}-{scale}'}
+    return isolated
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = ('Benchmark every named forum route on synthetic data of several sizes, in a throwaway '
+            'test database, and report latency percentiles, queries per request and peak memory as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='1,5', help='Comma separated multipliers of the base seed size')
+        parser.add_argument('--requests', type=int, default=20, help='Timed requests per route')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--routes', help='Comma separated route names, all named forum routes by default')
+
+    def handle(self, *args, **options):
+        scales = [int(scale) for scale in options['scales'].split(',')]
+        routes = [pattern.name for pattern in forum_urls.urlpatterns if pattern.name]
+        if options['routes']:
+            routes = [name for name in routes if name in options['routes'].split(',')]
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            report = {
+                'started_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'requests_per_route': options['requests'],
+                'scales': [self.run_scale(scale, routes, options['requests']) for scale in scales],
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+            self.stderr.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def run_scale(self, scale, routes, requests):
+        with override_settings(CACHES=bench_caches(scale)):
+            # Only the private caches of the run are cleared (and the L1 copies in front of them).
+            for alias in caches:
+                caches[alias].clear()
+            return self.bench_scale(scale, routes, requests)
+
+    def bench_scale(self, scale, routes, requests):
+        call_command('flush', interactive=False, verbosity=0)
+        seed = {'users': 20 * scale, 'categories': 2, 'subcategories': 2 * scale, 'topics': 10 * scale,
+                'posts': 10 * scale, 'comments': 2, 'likes': 3}
+        call_command('seed_forum', stdout=io.StringIO(), **seed)
+
+        user = User.objects.create_superuser('bench', 'bench@example.com', 'bench')
+        Profile.objects.create(user=user, first_name='Bench', filled=True)
+        client = Client()
+        client.force_login(user)
+
+        topic = Topic.objects.order_by('-post_count', 'id').first()
+        post = Post.objects.filter(topic=topic).order_by('-id').first()
+        comment = Comment.objects.filter(post=post).first()
+        kwargs = {
+            'category_slug': topic.category_slug, 'subcategory_slug': topic.subcategory_slug,
+            'topic_id': topic.id, 'post_id': post.id, 'comment_id': comment.id,
+            'profile_id': Profile.objects.exclude(user=user).values_list('id', flat=True).first(),
+        }
+        self.stderr.write(f'Scale {scale}: {seed}')
+        return {
+            'scale': scale,
+            'seed': seed,
+            'routes': {name: self.bench_route(client, name, kwargs, requests) for name in routes},
+        }
+
+    def bench_route(self, client, name, kwargs, requests):
+        pattern = next(pattern for pattern in forum_urls.urlpatterns if pattern.name == name)
+        url = reverse(name, kwargs={key: kwargs[key] for key in pattern.pattern.converters})
+        data = {'q': 'джанго форум'} if name == 'search' else None
+
+        def request(i):
+            if name in POST_ROUTES:
+                toggled = name if i % 2 == 0 else POST_ROUTES[name]
+                return client.post(reverse(toggled, kwargs={key: kwargs[key] for key in pattern.pattern.converters}))
+            return client.get(url, data)
+
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries[-1] += 1
+            return execute(sql, params, many, context)
+
+        # One untimed request under tracemalloc for the peak memory of a cold request.
+        tracemalloc.start()
+        queries.append(0)
+        with connection.execute_wrapper(count_queries):
+            status = request(0).status_code
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        latencies = []
+        for i in range(1, requests + 1):
+            queries.append(0)
+            with connection.execute_wrapper(count_queries):
+                start = time.perf_counter()
+                request(i)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        return {
+            'url': url,
+            'status': status,
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'queries_cold': queries[0],
+            'queries_per_request': round(statistics.mean(queries[1:]), 2),
+            'peak_memory_kb': round(peak_memory / 1024, 1),
+        }
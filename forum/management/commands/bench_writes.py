@@ -0,0 +1,104 @@
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+from django.test.utils import override_settings
+
+from forum import tasks, writer
+from forum.models import Category, SubCategory, Topic, Post
+from .bench_forum import percentile
+
+
+def create_post(topic_id, author_id, content):
+    post = Post(topic_id=topic_id, author_id=author_id, content=content)
+    post.save()
+    tasks.post_created(post)
+    return post.id
+
+
+class Command(BaseCommand):
+    help = ('Measure post creation throughput of concurrent writer threads, with and without the single '
+            'writer queue, in a throwaway SQLite database file, and report it as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=50, help='Posts created by every thread')
+        parser.add_argument('--modes', default='direct,queue', help='Comma separated: direct, queue')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_writes measures the SQLite write path')
+        with tempfile.TemporaryDirectory() as directory:
+            # A file database (not the in-memory test database) so threads contend for the real file lock.
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                user = User.objects.create_user('bench-writer')
+                category = Category.objects.create(name='Bench', slug='bench-writes')
+                subcategory = SubCategory.objects.create(category=category, name='Bench', slug='bench-writes')
+                topic = Topic.objects.create(subcategory=subcategory, author=user, title='Bench', content='Bench')
+                report = {
+                    'threads': options['threads'],
+                    'writes_per_thread': options['writes'],
+                    'options': settings.DATABASES['default'].get('OPTIONS', {}),
+                    'modes': {mode: self.run_mode(mode, topic.id, user.id, options['threads'], options['writes'])
+                              for mode in options['modes'].split(',')},
+                }
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+            self.stderr.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def run_mode(self, mode, topic_id, author_id, threads, writes):
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def worker(number):
+            local = []
+            for i in range(writes):
+                start = time.perf_counter()
+                try:
+                    writer.write(create_post, topic_id, author_id, f'bench {mode} {number} {i}')
+                except OperationalError as error:
+                    with lock:
+                        errors.append(str(error))
+                    continue
+                local.append((time.perf_counter() - start) * 1000)
+            close_old_connections()
+            connection.close()
+            with lock:
+                latencies.extend(local)
+
+        with override_settings(FORUM_SQLITE_WRITE_QUEUE=mode == 'queue'):
+            workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+            start = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+        self.stderr.write(f'{mode}: {len(latencies)} writes in {elapsed:.2f}s, {len(errors)} errors')
+        return {
+            'writes': len(latencies),
+            'errors': len(errors),
+            'error_samples': sorted(set(errors))[:3],
+            'writes_per_second': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(statistics.median(latencies), 3) if latencies else None,
+            'p95_ms': round(percentile(latencies, 0.95), 3) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99), 3) if latencies else None,
+        }
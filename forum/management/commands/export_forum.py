@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from forum.exporter import export_lines, encode, parse_bound, CHUNK_SIZE
+from forum.taxonomy import registry
+
+
+class Command(BaseCommand):
+    help = ('Stream topics, posts and comments as JSONL in constant memory. '
+            '--since/--until select topics by creation date and export their whole threads')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subcategory', help='Slug of the subcategory to export')
+        parser.add_argument('--topic', type=int, help='Id of a single topic to export')
+        parser.add_argument('--since', help='Date or datetime, inclusive')
+        parser.add_argument('--until', help='Date or datetime, a date includes the whole day')
+        parser.add_argument('--output', help='Output file, stdout by default')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output with gzip')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        subcategory = None
+        if options['subcategory']:
+            subcategory = registry.get_subcategory(options['subcategory'])
+            if subcategory is None:
+                raise CommandError(f"Unknown subcategory {options['subcategory']!r}")
+        try:
+            since = parse_bound(options['since'])
+            until = parse_bound(options['until'], end=True)
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        lines = export_lines(subcategory, options['topic'], since, until, options['chunk_size'])
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in encode(lines, options['gzip']):
+                output.write(chunk)
+        finally:
+            if options['output']:
+                output.close()
+            else:
+                output.flush()
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from forum.bulk import preserve_timestamps, rebuild_derived_data
+from forum.importer import ForumImporter, ForumImportError, KINDS
+from forum.models import Profile, Topic, Post, Comment
+
+
+class Command(BaseCommand):
+    help = ('Import a legacy forum from JSONL (records with a "type" key) or per-type CSV dumps. '
+            'Interrupted imports resume from the last committed batch when run again with the same --source')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Dump files in dependency order, e.g. users.csv topics.csv ...')
+        parser.add_argument('--source', default='legacy', help='Name of the imported forum, scopes ids and checkpoints')
+        parser.add_argument('--type', choices=KINDS, help='Record type of CSV files not named after their type')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--skip-rebuild', action='store_true',
+                            help='Do not recompute counters, search index and caches afterwards')
+
+    def handle(self, *args, **options):
+        importer = ForumImporter(options['source'], options['batch_size'])
+        try:
+            with preserve_timestamps(Profile, Topic, Post, Comment):
+                for path in options['paths']:
+                    importer.import_file(path, options['type'])
+                    self.stdout.write(f'{path}: done')
+        except ForumImportError as error:
+            raise CommandError(str(error))
+        finally:
+            for key, value in sorted(importer.stats.items()):
+                if not value:
+                    continue
+                self.stdout.write(f'  {key}: {value}')
+
+        if not options['skip_rebuild']:
+            rebuild_derived_data()
+        self.stdout.write(self.style.SUCCESS('Import finished'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from forum.purge import purge_deleted, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Hard-delete soft-deleted topics and posts with their comments and likes in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        stats = purge_deleted(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {stats['topics']} topics, {stats['posts']} posts, "
+            f"{stats['comments']} comments and {stats['likes']} likes"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from forum.search import rebuild_index, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of topics, posts and comments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = rebuild_index(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} documents'))
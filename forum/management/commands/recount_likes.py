@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from forum.counters import recount_post_likes
+from forum.likes import like_buffer
+from forum.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized like counters of posts from the like rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('post_ids', nargs='*', type=int, help='Only recount these posts')
+
+    def handle(self, *args, **options):
+        like_buffer.flush()
+        posts = Post.objects.all()
+        if options['post_ids']:
+            posts = posts.filter(id__in=options['post_ids'])
+        updated = recount_post_likes(posts)
+        self.stdout.write(self.style.SUCCESS(f'Recounted {updated} posts'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from forum.counters import recount_topics
+from forum.models import Topic
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized post/comment counters and last post info of topics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('topic_ids', nargs='*', type=int, help='Only recount these topics')
+
+    def handle(self, *args, **options):
+        topics = Topic.objects.all()
+        if options['topic_ids']:
+            topics = topics.filter(id__in=options['topic_ids'])
+        updated = recount_topics(topics)
+        self.stdout.write(self.style.SUCCESS(f'Recounted {updated} topics'))
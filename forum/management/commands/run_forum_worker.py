@@ -0,0 +1,37 @@
+import json
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from forum.jobs import Worker, queue_depth
+
+
+class Command(BaseCommand):
+    help = ('Run queued forum jobs (counters, search index, purges) on a thread pool until stopped, '
+            'then print per-job-type throughput as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls of an empty queue')
+        parser.add_argument('--stats-interval', type=float, default=60.0, help='Seconds between stats lines, 0 for none')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due instead of waiting for more')
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options['threads'], poll_interval=options['poll_interval'])
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: worker.stop())
+
+        reporter = None
+        if options['stats_interval'] > 0 and not options['once']:
+            reporter = threading.Thread(target=self.report, args=(worker, options['stats_interval']), daemon=True)
+            reporter.start()
+
+        self.stderr.write(f"Worker {worker.name} running with {options['threads']} threads")
+        worker.run(once=options['once'])
+        self.stdout.write(json.dumps({'worker': worker.name, 'jobs': worker.stats.snapshot(),
+                                      'queue': queue_depth()}, indent=2))
+
+    def report(self, worker, interval):
+        while not worker.stopping.wait(interval):
+            self.stderr.write(json.dumps({'jobs': worker.stats.snapshot()}))
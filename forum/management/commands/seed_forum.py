@@ -0,0 +1,94 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from forum.bulk import chunked, preserve_timestamps, rebuild_derived_data
+from forum.models import Profile, Category, SubCategory, Topic, Post, Comment, Like
+
+WORDS = ('форум', 'джанго', 'пайтон', 'питання', 'відповідь', 'база', 'даних', 'кеш', 'сервер', 'запит',
+         'шаблон', 'модель', 'сторінка', 'індекс', 'швидкість', 'тест', 'код', 'помилка', 'версія', 'мова')
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a synthetic forum of a configurable size using chunked bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--categories', type=int, default=3)
+        parser.add_argument('--subcategories', type=int, default=3, help='Per category')
+        parser.add_argument('--topics', type=int, default=20, help='Per subcategory')
+        parser.add_argument('--posts', type=int, default=20, help='Per topic')
+        parser.add_argument('--comments', type=int, default=2, help='Per post')
+        parser.add_argument('--likes', type=int, default=3, help='Per post, at most the number of users')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='seed', help='Prefix of generated usernames and slugs')
+
+    def text(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        chunk_size = options['chunk_size']
+        prefix = options['prefix']
+        start = timezone.now() - timedelta(days=365)
+
+        with transaction.atomic(), preserve_timestamps(Profile, Topic, Post, Comment):
+            password = make_password(None)
+            users = []
+            for chunk in chunked(range(options['users']), chunk_size):
+                users += User.objects.bulk_create(
+                    [User(username=f'{prefix}-user-{i}', password=password) for i in chunk])
+            for chunk in chunked(users, chunk_size):
+                Profile.objects.bulk_create([
+                    Profile(user=user, first_name=f'User{user.id}', last_name='Seed', filled=True,
+                            joined_date=start.date()) for user in chunk])
+            user_ids = [user.id for user in users]
+
+            categories = Category.objects.bulk_create([
+                Category(name=f'Category {i}', slug=f'{prefix}-category-{i}') for i in range(options['categories'])])
+            subcategories = SubCategory.objects.bulk_create([
+                SubCategory(category=category, name=f'Subcategory {category.id}-{i}',
+                            slug=f'{prefix}-subcategory-{category.id}-{i}',
+                            slug_path=f'{category.slug}/{prefix}-subcategory-{category.id}-{i}')
+                for category in categories for i in range(options['subcategories'])])
+
+            counts = {'topics': 0, 'posts': 0, 'comments': 0, 'likes': 0}
+            topic_specs = ((subcategory, i) for subcategory in subcategories for i in range(options['topics']))
+            for topic_chunk in chunked(topic_specs, max(chunk_size // max(options['posts'], 1), 1)):
+                topics = Topic.objects.bulk_create([
+                    Topic(title=self.text(4).capitalize(), content=self.text(30), subcategory=subcategory,
+                          author_id=self.random.choice(user_ids), slug_path=subcategory.slug_path,
+                          created_at=start + timedelta(minutes=self.random.randrange(60 * 24 * 300)))
+                    for subcategory, i in topic_chunk])
+                counts['topics'] += len(topics)
+                self.seed_posts(topics, user_ids, options, counts)
+
+            rebuild_derived_data()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(users)} users, {len(categories)} categories, {len(subcategories)} subcategories, "
+            f"{counts['topics']} topics, {counts['posts']} posts, {counts['comments']} comments, "
+            f"{counts['likes']} likes"))
+
+    def seed_posts(self, topics, user_ids, options, counts):
+        posts = Post.objects.bulk_create([
+            Post(topic=topic, author_id=self.random.choice(user_ids), content=self.text(40),
+                 created_at=topic.created_at + timedelta(minutes=i * 7 + self.random.randrange(7)))
+            for topic in topics for i in range(options['posts'])])
+        comments = Comment.objects.bulk_create([
+            Comment(post=post, author_id=self.random.choice(user_ids), content=self.text(15),
+                    created_at=post.created_at + timedelta(minutes=i + 1))
+            for post in posts for i in range(options['comments'])])
+        likes_per_post = min(options['likes'], len(user_ids))
+        likes = Like.objects.bulk_create([
+            Like(post=post, user_id=user_id)
+            for post in posts for user_id in self.random.sample(user_ids, likes_per_post)])
+        counts['posts'] += len(posts)
+        counts['comments'] += len(comments)
+        counts['likes'] += len(likes)
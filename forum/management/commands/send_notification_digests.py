@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from forum.notifications import send_digests, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Email users who asked for it a digest of their unread subscription notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Emails sent over one connection')
+
+    def handle(self, *args, **options):
+        sent = send_digests(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} digests'))
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+
+from forum.taxonomy import registry
+
+
+class Command(BaseCommand):
+    help = 'Pre-render the cached homepage and topic listings, e.g. right after a deploy'
+
+    def add_arguments(self, parser):
+        default_host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+        parser.add_argument('--host', default=default_host,
+                            help='Host the pages are requested for, it is part of the page cache key')
+        parser.add_argument('--secure', action='store_true', help='Warm the https variants of the pages')
+
+    def handle(self, *args, **options):
+        # Pages are requested through the full middleware stack, so the entries
+        # land under exactly the keys anonymous visitors will look up.
+        client = Client(HTTP_HOST=options['host'])
+        urls = [reverse('homepage')]
+        for category in registry.categories():
+            urls.append(category.get_absolute_url())
+            urls.extend(subcategory.get_absolute_url() for subcategory in category.subcategories)
+
+        warmed = 0
+        for url in urls:
+            response = client.get(url, secure=options['secure'])
+            if response.status_code == 200:
+                warmed += 1
+            else:
+                self.stderr.write(f'{url}: {response.status_code}')
+        self.stdout.write(self.style.SUCCESS(f'Warmed {warmed} of {len(urls)} pages'))
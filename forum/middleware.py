@@ -0,0 +1,220 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse
+
+from . import db_router, ratelimit
+
+logger = logging.getLogger('forum.queries')
+
+# Collapses "IN (%s, %s, %s)" and VALUES lists so queries differing only in the
+# number of parameters share one shape.
+PLACEHOLDER_LIST_RE = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_shape(sql):
+    return NUMBER_RE.sub('N', PLACEHOLDER_LIST_RE.sub('(...)', sql))
+
+
+class QueryProfile:
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[query_shape(sql)] += 1
+
+    def repeated(self, threshold):
+        return {shape: count for shape, count in self.shapes.items() if count >= threshold}
+
+
+class QueryStats:
+    """Per-view aggregates of the profiled requests of this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def record(self, view_name, profile, repeated, over_budget):
+        with self._lock:
+            stats = self._views.setdefault(view_name, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_time_ms': 0.0,
+                'n_plus_one_requests': 0, 'over_budget_requests': 0, 'repeated_shapes': {},
+            })
+            stats['requests'] += 1
+            stats['queries'] += profile.count
+            stats['max_queries'] = max(stats['max_queries'], profile.count)
+            stats['db_time_ms'] += profile.duration * 1000
+            stats['over_budget_requests'] += int(over_budget)
+            if repeated:
+                stats['n_plus_one_requests'] += 1
+                for shape, count in repeated.items():
+                    stats['repeated_shapes'][shape] = max(stats['repeated_shapes'].get(shape, 0), count)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                view_name: {**stats, 'avg_queries': stats['queries'] / stats['requests'],
+                            'repeated_shapes': dict(stats['repeated_shapes'])}
+                for view_name, stats in self._views.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+query_stats = QueryStats()
+
+
+class QueryProfilerMiddleware:
+    """
+    Opt-in (``FORUM_QUERY_PROFILER = True``) per-request SQL profiling.
+
+    Counts queries and database time of every request, flags query shapes
+    repeated ``FORUM_N_PLUS_ONE_THRESHOLD`` or more times as likely N+1 loops
+    and checks the ``query_budget`` declared on class-based views. Budget
+    overruns are logged, or raised with ``FORUM_QUERY_BUDGET_RAISE = True``
+    (meant for tests).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'FORUM_QUERY_PROFILER', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'FORUM_N_PLUS_ONE_THRESHOLD', 5)
+        self.raise_on_budget = getattr(settings, 'FORUM_QUERY_BUDGET_RAISE', False)
+
+    def __call__(self, request):
+        profile = QueryProfile()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+
+        view_name, budget = getattr(request, '_query_budget', (request.path, None))
+        repeated = profile.repeated(self.threshold)
+        over_budget = budget is not None and profile.count > budget
+        query_stats.record(view_name, profile, repeated, over_budget)
+
+        for shape, count in repeated.items():
+            logger.warning('Possible N+1 in %s: %d x %s', view_name, count, shape)
+        if over_budget:
+            message = f'{view_name} ran {profile.count} queries, its budget is {budget}'
+            if self.raise_on_budget:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        view_name = request.resolver_match.view_name if request.resolver_match else view_func.__name__
+        request._query_budget = (view_name, getattr(view_class, 'query_budget', None))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Routes the reads of GET/HEAD requests to views declaring ``use_replica = True``
+    to a replica (see forum.db_router). A request that wrote to the primary sets
+    the ``FORUM_PRIMARY_COOKIE`` cookie for ``FORUM_REPLICA_STICKY_SECONDS``,
+    and while it is present all reads of that client use the primary, so users
+    see their own posts even when the replicas lag behind.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not db_router.replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.cookie_name = getattr(settings, 'FORUM_PRIMARY_COOKIE', 'forum_primary')
+        self.sticky_seconds = getattr(settings, 'FORUM_REPLICA_STICKY_SECONDS', 10)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = db_router.begin_request()
+        try:
+            response = self.get_response(request)
+            return self.finish(request, response)
+        finally:
+            db_router.end_request(token)
+
+    async def __acall__(self, request):
+        token = db_router.begin_request()
+        try:
+            response = await self.get_response(request)
+            return self.finish(request, response)
+        finally:
+            db_router.end_request(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        if (request.method in ('GET', 'HEAD') and getattr(view_class, 'use_replica', False)
+                and self.cookie_name not in request.COOKIES):
+            db_router.choose_replica(db_router.current_state())
+
+    def finish(self, request, response):
+        if db_router.current_state().wrote and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.set_cookie(self.cookie_name, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+
+class RateLimitMiddleware:
+    """
+    Throttles the writes of class-based views declaring ``rate_limit``, the
+    name of a ``FORUM_RATE_LIMITS`` entry of ``(requests, seconds)``, per user
+    or, for anonymous clients, per address (see forum.ratelimit). Clients over
+    the limit get a 429 before the view runs, without touching the database.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'FORUM_RATE_LIMITS', None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        # Returns the coroutine of an async chain as is.
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        scope = getattr(getattr(view_func, 'view_class', None), 'rate_limit', None)
+        limit = ratelimit.get_limit(scope) if scope and request.method not in ('GET', 'HEAD', 'OPTIONS') else None
+        if limit is None:
+            return None
+        retry_after = ratelimit.hit(scope, ratelimit.client_id(request), *limit)
+        if retry_after is None:
+            return None
+        response = HttpResponse('Забагато запитів, спробуйте пізніше.', status=429,
+                                content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(retry_after)
+        return response
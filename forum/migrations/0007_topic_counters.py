@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    Topic = apps.get_model('forum', 'Topic')
+    Post = apps.get_model('forum', 'Post')
+    Comment = apps.get_model('forum', 'Comment')
+
+    posts = Post.objects.filter(topic=OuterRef('pk'))
+    post_count = posts.order_by().values('topic').annotate(c=Count('id')).values('c')
+    comment_count = Comment.objects.filter(post__topic=OuterRef('pk')).order_by() \
+        .values('post__topic').annotate(c=Count('id')).values('c')
+    last_post = posts.order_by('-created_at', '-id')
+
+    Topic.objects.update(
+        post_count=Coalesce(Subquery(post_count), 0),
+        comment_count=Coalesce(Subquery(comment_count), 0),
+        last_post_at=Subquery(last_post.values('created_at')[:1]),
+        last_post_author=Subquery(last_post.values('author')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0006_post_topic_created_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Кількість коментарів'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='last_post_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата останнього поста'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='last_post_author',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор останнього поста'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Кількість постів'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:53
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Coalesce
+
+
+def fill_last_activity(apps, schema_editor):
+    Topic = apps.get_model('forum', 'Topic')
+    Topic.objects.update(last_activity_at=Coalesce(F('last_post_at'), F('created_at')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0007_topic_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Остання активність'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='pinned',
+            field=models.BooleanField(default=False, verbose_name='Закріплене'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['subcategory', '-pinned', '-last_activity_at', '-id'], name='topic_listing_idx'),
+        ),
+        migrations.RunPython(fill_last_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:54
+
+from django.db import migrations, models
+
+
+def fill_slug_paths(apps, schema_editor):
+    SubCategory = apps.get_model('forum', 'SubCategory')
+    Topic = apps.get_model('forum', 'Topic')
+    for subcategory in SubCategory.objects.select_related('category'):
+        subcategory.slug_path = f'{subcategory.category.slug}/{subcategory.slug}'
+        subcategory.save(update_fields=['slug_path'])
+        Topic.objects.filter(subcategory=subcategory).update(slug_path=subcategory.slug_path)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0008_topic_listing_order'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subcategory',
+            name='slug_path',
+            field=models.CharField(default='', editable=False, max_length=101, verbose_name='Шлях'),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='slug_path',
+            field=models.CharField(default='', editable=False, max_length=101, verbose_name='Шлях'),
+        ),
+        migrations.RunPython(fill_slug_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0011_post_like_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=64, verbose_name='Джерело')),
+                ('path', models.CharField(max_length=255, verbose_name='Файл')),
+                ('line', models.PositiveBigIntegerField(default=0, verbose_name='Оброблено рядків')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата оновлення')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'path'), name='unique_import_checkpoint')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportIdMap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=64, verbose_name='Джерело')),
+                ('kind', models.CharField(max_length=16, verbose_name='Тип')),
+                ('legacy_id', models.CharField(max_length=64, verbose_name='Старий id')),
+                ('new_id', models.BigIntegerField(verbose_name='Новий id')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'kind', 'legacy_id'), name='unique_import_id')],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_user_activity(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    UserActivity = apps.get_model('forum', 'UserActivity')
+    UserActivity.objects.bulk_create([UserActivity(user_id=user_id)
+                                      for user_id in User.objects.values_list('pk', flat=True).iterator()],
+                                     batch_size=1000)
+
+    def count(model_name):
+        return apps.get_model('forum', model_name).objects.filter(author=OuterRef('user')).order_by() \
+            .values('author').annotate(c=Count('id')).values('c')
+
+    last_post = apps.get_model('forum', 'Post').objects.filter(author=OuterRef('user')).order_by('-created_at', '-id')
+    UserActivity.objects.update(
+        topic_count=Coalesce(Subquery(count('Topic')), 0),
+        post_count=Coalesce(Subquery(count('Post')), 0),
+        comment_count=Coalesce(Subquery(count('Comment')), 0),
+        last_post_at=Subquery(last_post.values('created_at')[:1]),
+        last_post=Subquery(last_post.values('id')[:1]),
+        last_seen_at=Subquery(User.objects.filter(pk=OuterRef('user')).values('last_login')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('forum', '0012_import_tables'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivity',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='activity', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Користувач')),
+                ('topic_count', models.PositiveIntegerField(default=0, verbose_name='Кількість обговорень')),
+                ('post_count', models.PositiveIntegerField(default=0, verbose_name='Кількість постів')),
+                ('comment_count', models.PositiveIntegerField(default=0, verbose_name='Кількість коментарів')),
+                ('last_seen_at', models.DateTimeField(blank=True, null=True, verbose_name='Останній візит')),
+                ('last_post_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата останнього поста')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='comment_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='topic_author_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='useractivity',
+            name='last_post',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='forum.post', verbose_name='Останній пост'),
+        ),
+        migrations.RunPython(fill_user_activity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:24
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0015_soft_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, verbose_name='Тип')),
+                ('payload', models.JSONField(default=dict, verbose_name='Параметри')),
+                ('key', models.CharField(blank=True, max_length=128, null=True, verbose_name='Ключ ідемпотентності')),
+                ('status', models.CharField(choices=[('pending', 'Очікує'), ('running', 'Виконується'), ('done', 'Виконано'), ('failed', 'Помилка')], default='pending', max_length=8, verbose_name='Стан')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Спроб')),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5, verbose_name='Максимум спроб')),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Виконати після')),
+                ('claimed_by', models.CharField(blank=True, default='', max_length=64, verbose_name='Обробник')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата початку')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершення')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Остання помилка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата створення')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_at', 'id'], name='job_queue_idx'), models.Index(fields=['claimed_by'], name='job_claim_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('key',), name='unique_pending_job_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0016_job_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='useractivity',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Непрочитаних сповіщень'),
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата створення')),
+                ('read_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата прочитання')),
+                ('email', models.BooleanField(default=False, verbose_name='Для дайджесту')),
+                ('emailed_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата надсилання')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='forum.post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL, verbose_name='Користувач')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-created_at', '-id'], name='notification_inbox_idx'), models.Index(condition=models.Q(('email', True), ('emailed_at__isnull', True), ('read_at__isnull', True)), fields=['user'], name='notification_digest_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'post'), name='unique_notification')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Subscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email_digest', models.BooleanField(default=False, verbose_name='Дайджест на пошту')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата створення')),
+                ('subcategory', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='forum.subcategory', verbose_name='Під категорія')),
+                ('topic', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to='forum.topic', verbose_name='Обговорення')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscriptions', to=settings.AUTH_USER_MODEL, verbose_name='Користувач')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'topic'), name='unique_topic_subscription'), models.UniqueConstraint(fields=('user', 'subcategory'), name='unique_subcategory_subscription'), models.CheckConstraint(condition=models.Q(('topic__isnull', True), ('subcategory__isnull', True), _connector='XOR'), name='subscription_single_target')],
+            },
+        ),
+    ]
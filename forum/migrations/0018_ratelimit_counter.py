@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0017_subscriptions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=200, unique=True, verbose_name='Ключ')),
+                ('count', models.IntegerField(default=0, verbose_name='Запитів')),
+                ('expires_at', models.DateTimeField(blank=True, null=True, verbose_name='Дійсний до')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='ratelimit_expiry_idx')],
+            },
+        ),
+    ]
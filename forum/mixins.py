@@ -1,7 +1,6 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import redirect, get_object_or_404
-from django.urls import reverse
-from .models import Profile
+from .profile_state import get_profile_state, record_last_seen
 from django.core.exceptions import PermissionDenied
 
 
@@ -12,13 +11,12 @@ class ProfileAndLoginRequired(LoginRequiredMixin):
 
         if not request.user.is_authenticated:
             return super().dispatch(request, *args, **kwargs)
-        
-        try:
-            profile_exists = bool(request.user.profile)
-        except Profile.DoesNotExist:
-            profile_exists = False
 
-        if request.path == reverse('create-profile'):
+        request.profile_state = get_profile_state(request)
+        record_last_seen(request)
+        profile_exists = request.profile_state.exists
+
+        if getattr(request.resolver_match, 'url_name', None) == 'create-profile':
             if profile_exists:
                 return redirect('homepage')
             else:
@@ -1,10 +1,19 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.text import slugify
 # Create your models here.
 
 
+class VisibleManager(models.Manager):
+    """Hides soft-deleted rows, they stay in the table until ``forum.purge`` removes them."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Profile(models.Model):
     first_name = models.CharField(verbose_name="Ім'я", max_length=20, null=True)
     last_name = models.CharField(verbose_name="Фамілія", max_length=20, null=True)
@@ -20,14 +29,26 @@ class Profile(models.Model):
         return reverse("user-profile", kwargs={"profile_id": self.id})
 
 
+# First path segments taken by the fixed pages in forum/urls.py, which come
+# before '<slug:category_slug>/', so a category with one of them could not be opened.
+RESERVED_CATEGORY_SLUGS = ('search', 'profiler', 'export', 'notifications')
+
+
 class Category(models.Model):
     name = models.CharField(verbose_name='Назва категорії', max_length=32)
     slug = models.SlugField(verbose_name='Slug', blank=True, unique=True)
 
+    def clean(self):
+        if (self.slug or slugify(self.name)) in RESERVED_CATEGORY_SLUGS:
+            raise ValidationError({'slug': 'Ця адреса зайнята сторінкою форуму, оберіть інший slug.'})
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
         super().save(*args, **kwargs)
+        for subcategory in self.subcategory.all():
+            subcategory.category = self
+            subcategory.save()
 
     def __str__(self):
         return self.name
@@ -40,17 +61,26 @@ class SubCategory(models.Model):
     category = models.ForeignKey(Category, verbose_name='Категорія', related_name='subcategory', on_delete=models.CASCADE)
     name = models.CharField(verbose_name='Назва підкатегорії', max_length=32)
     slug = models.SlugField(verbose_name='slug', blank=True, unique=True)
+    slug_path = models.CharField(verbose_name='Шлях', max_length=101, editable=False, default='')
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        self.slug_path = f'{self.category.slug}/{self.slug}'
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'slug_path'}
         super().save(*args, **kwargs)
+        Topic.objects.filter(subcategory=self).exclude(slug_path=self.slug_path).update(slug_path=self.slug_path)
 
     def __str__(self):
         return self.name
 
+    @property
+    def category_slug(self):
+        return self.slug_path.split('/')[0]
+
     def get_absolute_url(self):
-        return reverse("subcategory-topics", kwargs={"category_slug": self.category.slug, "subcategory_slug": self.slug})
+        return reverse("subcategory-topics", kwargs={"category_slug": self.category_slug, "subcategory_slug": self.slug})
 
 
 class Topic(models.Model):
@@ -60,10 +90,46 @@ class Topic(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата створення')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата оновлення')
     author = models.ForeignKey(User, verbose_name='Автор', on_delete=models.CASCADE)
+    post_count = models.PositiveIntegerField(default=0, verbose_name='Кількість постів')
+    comment_count = models.PositiveIntegerField(default=0, verbose_name='Кількість коментарів')
+    last_post_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата останнього поста')
+    last_post_author = models.ForeignKey(User, verbose_name='Автор останнього поста', related_name='+',
+                                         null=True, blank=True, on_delete=models.SET_NULL)
+    last_activity_at = models.DateTimeField(default=timezone.now, verbose_name='Остання активність')
+    pinned = models.BooleanField(default=False, verbose_name='Закріплене')
+    slug_path = models.CharField(verbose_name='Шлях', max_length=101, editable=False, default='')
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Дата видалення')
+
+    objects = VisibleManager()
+    all_objects = models.Manager()
+
+    LISTING_ORDERING = ('-pinned', '-last_activity_at', '-id')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['subcategory', '-pinned', '-last_activity_at', '-id'], name='topic_listing_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='topic_author_created_idx'),
+            models.Index(fields=['deleted_at'], name='topic_deleted_idx', condition=models.Q(deleted_at__isnull=False)),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Copy the slug path of the subcategory so URLs can be built without touching the database.
+        self.slug_path = self.subcategory.slug_path
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'slug_path'}
+        super().save(*args, **kwargs)
+
+    @property
+    def category_slug(self):
+        return self.slug_path.split('/')[0]
+
+    @property
+    def subcategory_slug(self):
+        return self.slug_path.split('/')[-1]
 
     def get_absolute_url(self):
-        return reverse("topic", kwargs={"category_slug": self.subcategory.category.slug,
-                                        "subcategory_slug": self.subcategory.slug, "topic_id": self.id})
+        return reverse("topic", kwargs={"category_slug": self.category_slug,
+                                        "subcategory_slug": self.subcategory_slug, "topic_id": self.id})
 
     def __str__(self):
         return self.title
@@ -74,6 +140,19 @@ class Post(models.Model):
     topic = models.ForeignKey(Topic, verbose_name='Обговорення', on_delete=models.CASCADE, related_name='posts')
     author = models.ForeignKey(User, verbose_name='Автор', related_name='post_author', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата створення')
+    like_count = models.PositiveIntegerField(default=0, verbose_name='Кількість вподобань')
+    comment_count = models.PositiveIntegerField(default=0, verbose_name='Кількість коментарів')
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name='Дата видалення')
+
+    objects = VisibleManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['topic', '-created_at', '-id'], name='post_topic_created_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_created_idx'),
+            models.Index(fields=['deleted_at'], name='post_deleted_idx', condition=models.Q(deleted_at__isnull=False)),
+        ]
 
     def __str__(self):
         return f'{self.topic.title}, {self.author} '
@@ -85,6 +164,25 @@ class Comment(models.Model):
     author = models.ForeignKey(User, verbose_name='Автор', related_name='comment_author', on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата створення')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', '-created_at', '-id'], name='comment_author_created_idx'),
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_idx'),
+        ]
+
+
+class UserActivity(models.Model):
+    user = models.OneToOneField(User, verbose_name='Користувач', related_name='activity', primary_key=True,
+                                on_delete=models.CASCADE)
+    topic_count = models.PositiveIntegerField(default=0, verbose_name='Кількість обговорень')
+    post_count = models.PositiveIntegerField(default=0, verbose_name='Кількість постів')
+    comment_count = models.PositiveIntegerField(default=0, verbose_name='Кількість коментарів')
+    last_seen_at = models.DateTimeField(null=True, blank=True, verbose_name='Останній візит')
+    last_post_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата останнього поста')
+    last_post = models.ForeignKey(Post, verbose_name='Останній пост', related_name='+', null=True, blank=True,
+                                  on_delete=models.SET_NULL)
+    unread_count = models.PositiveIntegerField(default=0, verbose_name='Непрочитаних сповіщень')
+
 
 class Like(models.Model):
     user = models.ForeignKey(User, verbose_name='Користувач', on_delete=models.CASCADE)
@@ -94,3 +192,109 @@ class Like(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['user', 'post'], name='unique_like')
         ]
+
+
+class Subscription(models.Model):
+    user = models.ForeignKey(User, verbose_name='Користувач', related_name='subscriptions', on_delete=models.CASCADE)
+    topic = models.ForeignKey(Topic, verbose_name='Обговорення', related_name='subscriptions', null=True, blank=True,
+                              on_delete=models.CASCADE)
+    subcategory = models.ForeignKey(SubCategory, verbose_name='Під категорія', related_name='subscriptions',
+                                    null=True, blank=True, on_delete=models.CASCADE)
+    email_digest = models.BooleanField(default=False, verbose_name='Дайджест на пошту')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата створення')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'topic'], name='unique_topic_subscription'),
+            models.UniqueConstraint(fields=['user', 'subcategory'], name='unique_subcategory_subscription'),
+            models.CheckConstraint(condition=models.Q(topic__isnull=True) ^ models.Q(subcategory__isnull=True),
+                                   name='subscription_single_target'),
+        ]
+
+
+class Notification(models.Model):
+    user = models.ForeignKey(User, verbose_name='Користувач', related_name='notifications', on_delete=models.CASCADE)
+    post = models.ForeignKey(Post, verbose_name='Пост', related_name='notifications', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата створення')
+    read_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата прочитання')
+    email = models.BooleanField(default=False, verbose_name='Для дайджесту')
+    emailed_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата надсилання')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_inbox_idx'),
+            models.Index(fields=['user'], name='notification_digest_idx',
+                         condition=models.Q(email=True, emailed_at__isnull=True, read_at__isnull=True)),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='unique_notification')
+        ]
+
+
+class ImportIdMap(models.Model):
+    source = models.CharField(verbose_name='Джерело', max_length=64)
+    kind = models.CharField(verbose_name='Тип', max_length=16)
+    legacy_id = models.CharField(verbose_name='Старий id', max_length=64)
+    new_id = models.BigIntegerField(verbose_name='Новий id')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'kind', 'legacy_id'], name='unique_import_id')
+        ]
+
+
+class ImportCheckpoint(models.Model):
+    source = models.CharField(verbose_name='Джерело', max_length=64)
+    path = models.CharField(verbose_name='Файл', max_length=255)
+    line = models.PositiveBigIntegerField(verbose_name='Оброблено рядків', default=0)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата оновлення')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'path'], name='unique_import_checkpoint')
+        ]
+
+
+class Job(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = ((PENDING, 'Очікує'), (RUNNING, 'Виконується'), (DONE, 'Виконано'), (FAILED, 'Помилка'))
+
+    name = models.CharField(verbose_name='Тип', max_length=64)
+    payload = models.JSONField(verbose_name='Параметри', default=dict)
+    key = models.CharField(verbose_name='Ключ ідемпотентності', max_length=128, null=True, blank=True)
+    status = models.CharField(verbose_name='Стан', max_length=8, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(verbose_name='Спроб', default=0)
+    max_attempts = models.PositiveSmallIntegerField(verbose_name='Максимум спроб', default=5)
+    run_at = models.DateTimeField(verbose_name='Виконати після', default=timezone.now)
+    claimed_by = models.CharField(verbose_name='Обробник', max_length=64, blank=True, default='')
+    claimed_at = models.DateTimeField(verbose_name='Дата початку', null=True, blank=True)
+    finished_at = models.DateTimeField(verbose_name='Дата завершення', null=True, blank=True)
+    last_error = models.TextField(verbose_name='Остання помилка', blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата створення')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at', 'id'], name='job_queue_idx'),
+            models.Index(fields=['claimed_by'], name='job_claim_idx'),
+        ]
+        constraints = [
+            # Only one pending job per key: enqueueing work that is already waiting is a no-op.
+            models.UniqueConstraint(fields=['key'], condition=models.Q(status='pending'), name='unique_pending_job_key')
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.id}'
+
+
+class RateLimitCounter(models.Model):
+    key = models.CharField(verbose_name='Ключ', max_length=200, unique=True)
+    count = models.IntegerField(verbose_name='Запитів', default=0)
+    expires_at = models.DateTimeField(verbose_name='Дійсний до', null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='ratelimit_expiry_idx'),
+        ]
@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import counters, writer
+from .db_router import primary_reads
+from .models import Post, Subscription, Notification, UserActivity
+from .page_cache import bump_page_groups
+
+BATCH_SIZE = 500
+DIGEST_ITEMS = 50
+
+
+def _unread_key(user_id):
+    return f'forum:unread:{user_id}'
+
+
+def unread_count(user_id):
+    """Unread notifications of the user, a cache hit or one primary key lookup."""
+    count = cache.get(_unread_key(user_id))
+    if count is None:
+        with primary_reads():
+            count = UserActivity.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first() or 0
+        cache.set(_unread_key(user_id), count, None)
+    return count
+
+
+def unread_changed(user_ids):
+    # Cached pages of these users show the badge too (see page_cache.request_key_prefix).
+    user_ids = list(user_ids)
+    cache.delete_many([_unread_key(user_id) for user_id in user_ids])
+    bump_page_groups(*(f'user:{user_id}' for user_id in user_ids))
+
+
+def get_subscription(user, **target):
+    if not user.is_authenticated:
+        return None
+    return Subscription.objects.filter(user=user, **target).first()
+
+
+async def aget_subscription(user, **target):
+    if not user.is_authenticated:
+        return None
+    return await Subscription.objects.filter(user=user, **target).afirst()
+
+
+def subscribe(user, topic_id=None, subcategory_id=None, email_digest=False):
+    # One upsert on the unique (user, topic) or (user, subcategory) pair.
+    Subscription.objects.bulk_create(
+        [Subscription(user=user, topic_id=topic_id, subcategory_id=subcategory_id, email_digest=email_digest)],
+        update_conflicts=True, update_fields=['email_digest'],
+        unique_fields=['user', 'topic'] if topic_id else ['user', 'subcategory'])
+    transaction.on_commit(lambda: bump_page_groups(f'user:{user.id}'))
+
+
+def unsubscribe(user, topic_id=None, subcategory_id=None):
+    Subscription.objects.filter(user=user, topic_id=topic_id, subcategory_id=subcategory_id).delete()
+    transaction.on_commit(lambda: bump_page_groups(f'user:{user.id}'))
+
+
+def fan_out(post_id, batch_size=BATCH_SIZE):
+    """
+    Put a notification about a new post into the inbox of every subscriber of
+    its topic or subcategory, ``batch_size`` users per insert and transaction.
+    Users already notified about the post are skipped, so an interrupted
+    fan-out can simply be run again. Returns the number of notifications.
+    """
+    post = Post.objects.filter(pk=post_id, topic__deleted_at__isnull=True).select_related('topic').first()
+    if post is None:
+        return 0
+    subscribers = Subscription.objects.filter(Q(topic_id=post.topic_id) | Q(subcategory_id=post.topic.subcategory_id))
+    user_ids = subscribers.exclude(user_id=post.author_id).values_list('user_id', flat=True) \
+        .distinct().order_by('user_id')
+    delivered, last_user_id = 0, 0
+    while batch := list(user_ids.filter(user_id__gt=last_user_id)[:batch_size]):
+        delivered += writer.write(_deliver, post, subscribers, batch)
+        last_user_id = batch[-1]
+    return delivered
+
+
+def _deliver(post, subscribers, user_ids):
+    notified = set(Notification.objects.filter(post=post, user_id__in=user_ids).values_list('user_id', flat=True))
+    user_ids = [user_id for user_id in user_ids if user_id not in notified]
+    if not user_ids:
+        return 0
+    digest_ids = set(subscribers.filter(user_id__in=user_ids, email_digest=True).values_list('user_id', flat=True))
+    Notification.objects.bulk_create([Notification(user_id=user_id, post=post, email=user_id in digest_ids)
+                                      for user_id in user_ids])
+    with_summary = set(UserActivity.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+    UserActivity.objects.filter(user_id__in=with_summary).update(unread_count=F('unread_count') + 1)
+    if len(with_summary) < len(user_ids):
+        counters.recount_user_activity(set(user_ids) - with_summary)
+    transaction.on_commit(lambda: unread_changed(user_ids))
+    return len(user_ids)
+
+
+def mark_all_read(user):
+    Notification.objects.filter(user=user, read_at__isnull=True).update(read_at=timezone.now())
+    UserActivity.objects.filter(user=user).update(unread_count=0)
+    transaction.on_commit(lambda: unread_changed([user.id]))
+
+
+def send_digests(batch_size=BATCH_SIZE):
+    """
+    Email every user one digest of their unread, not yet emailed notifications
+    from subscriptions with ``email_digest`` through ``EMAIL_BACKEND``, sending
+    ``batch_size`` messages over one connection. Returns the number of emails.
+    """
+    started = timezone.now()
+    pending = Notification.objects.filter(email=True, emailed_at__isnull=True, read_at__isnull=True,
+                                          created_at__lte=started)
+    user_ids = pending.values_list('user_id', flat=True).distinct().order_by('user_id')
+    site_url = getattr(settings, 'FORUM_SITE_URL', '')
+    sent, last_user_id = 0, 0
+    with get_connection() as connection:
+        while batch := list(user_ids.filter(user_id__gt=last_user_id)[:batch_size]):
+            last_user_id = batch[-1]
+            messages = []
+            for user in User.objects.filter(pk__in=batch).exclude(email=''):
+                notifications = pending.filter(user=user).select_related('post__topic', 'post__author__profile') \
+                    .order_by('-created_at', '-id')[:DIGEST_ITEMS]
+                body = render_to_string('forum/email/digest.txt', {
+                    'user': user, 'notifications': notifications, 'site_url': site_url, 'limit': DIGEST_ITEMS})
+                messages.append(EmailMessage('Нові пости у ваших підписках', body, to=[user.email]))
+            sent += connection.send_messages(messages) or 0
+            # Users without an email address are marked too, so they are not picked up again.
+            writer.write(lambda: pending.filter(user_id__in=batch).update(emailed_at=timezone.now()))
+    return sent
@@ -0,0 +1,222 @@
+import asyncio
+import base64
+import datetime
+import heapq
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def _json_default(value):
+    # DjangoJSONEncoder truncates microseconds, which would break the equality
+    # part of the seek condition, so datetimes are serialised in full.
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not serializable in a cursor')
+
+
+class KeysetPage:
+
+    def __init__(self, object_list, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.prev_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Cursor pagination over a fixed ordering such as ('-created_at', '-id').
+
+    Pages are selected with a ``WHERE (a, b) < (x, y)`` style filter instead of
+    ``OFFSET``, and no ``COUNT(*)`` is issued, so every page costs the same.
+    The last field of the ordering has to be unique (normally the primary key).
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = [self._parse(field) for field in ordering]
+        self.per_page = per_page
+
+    @staticmethod
+    def _parse(field):
+        if field.startswith('-'):
+            return field[1:], True
+        return field, False
+
+    def _order_by(self, reverse=False):
+        return [f'{"-" if desc != reverse else ""}{name}' for name, desc in self.ordering]
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, self.queryset.model._meta.get_field(name).attname) for name, _ in self.ordering]
+        raw = json.dumps(values, default=_json_default, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+            if len(values) != len(self.ordering):
+                return None
+            return [self.queryset.model._meta.get_field(name).to_python(value)
+                    for (name, _), value in zip(self.ordering, values)]
+        except (ValueError, TypeError, ValidationError):
+            return None
+
+    def _seek(self, values, reverse=False):
+        # Lexicographic "row comes after the cursor" in the requested direction:
+        # (a > x) OR (a = x AND b > y) OR ...
+        condition = Q()
+        for i, (name, desc) in enumerate(self.ordering):
+            lookup = 'lt' if desc != reverse else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for j, (prev_name, _) in enumerate(self.ordering[:i]):
+                term &= Q(**{prev_name: values[j]})
+            condition |= term
+        return condition
+
+    def _fetch(self, condition, reverse, limit):
+        return list(self._slice(self.queryset, condition, reverse, limit))
+
+    async def _afetch(self, condition, reverse, limit):
+        return [obj async for obj in self._slice(self.queryset, condition, reverse, limit)]
+
+    def _slice(self, queryset, condition, reverse, limit):
+        if condition is not None:
+            queryset = queryset.filter(condition)
+        return queryset.order_by(*self._order_by(reverse=reverse))[:limit]
+
+    def _plan(self, after, before):
+        after_values = self.decode_cursor(after) if after else None
+        before_values = self.decode_cursor(before) if before and after_values is None else None
+        if before_values is not None:
+            return self._seek(before_values, reverse=True), True, True
+        if after_values is not None:
+            return self._seek(after_values), False, True
+        return None, False, False
+
+    def _page(self, rows, backwards, from_cursor):
+        has_more = len(rows) > self.per_page
+        if backwards:
+            rows = rows[:self.per_page][::-1]
+            next_cursor = self.encode_cursor(rows[-1]) if rows else None
+            prev_cursor = self.encode_cursor(rows[0]) if rows and has_more else None
+        else:
+            rows = rows[:self.per_page]
+            next_cursor = self.encode_cursor(rows[-1]) if rows and has_more else None
+            prev_cursor = self.encode_cursor(rows[0]) if rows and from_cursor else None
+        return KeysetPage(rows, next_cursor, prev_cursor)
+
+    def get_page(self, after=None, before=None):
+        condition, backwards, from_cursor = self._plan(after, before)
+        return self._page(self._fetch(condition, backwards, self.per_page + 1), backwards, from_cursor)
+
+    async def aget_page(self, after=None, before=None):
+        condition, backwards, from_cursor = self._plan(after, before)
+        return self._page(await self._afetch(condition, backwards, self.per_page + 1), backwards, from_cursor)
+
+
+class MergedKeysetPaginator(KeysetPaginator):
+    """
+    Keyset pagination over the union of several querysets sharing one ordering.
+
+    Every part is read with its own index-backed seek limited to one page, and
+    the already sorted parts are merged in Python, so a listing spanning many
+    subcategories never has to sort all of their rows together.
+
+    Primary keys of different models are not comparable, so rows tied on the
+    other ordering fields are ordered by model (in the order the querysets
+    are given) before the last field, and the cursor carries the model too.
+    """
+
+    def __init__(self, querysets, ordering, per_page):
+        super().__init__(querysets[0] if querysets else None, ordering, per_page)
+        self.querysets = querysets
+        if len({desc for _, desc in self.ordering}) > 1:
+            raise ValueError('MergedKeysetPaginator needs all ordering fields in the same direction')
+        self.ranks = {}
+        for queryset in querysets:
+            self.ranks.setdefault(queryset.model, len(self.ranks))
+
+    def _values(self, obj):
+        return [getattr(obj, obj._meta.get_field(name).attname) for name, _ in self.ordering]
+
+    def encode_cursor(self, obj):
+        values = self._values(obj)
+        values.insert(-1, self.ranks[type(obj)])
+        raw = json.dumps(values, default=_json_default, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        if not self.querysets:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+            if len(values) != len(self.ordering) + 1 or values[-2] not in self.ranks.values():
+                return None
+            rank = values.pop(-2)
+            return [self.queryset.model._meta.get_field(name).to_python(value)
+                    for (name, _), value in zip(self.ordering, values)] + [rank]
+        except (ValueError, TypeError, ValidationError):
+            return None
+
+    def _seek(self, values, reverse=False):
+        # Built per part in _part_seek, as it depends on the model of the part.
+        return values, reverse
+
+    def _part_seek(self, queryset, values, reverse):
+        *values, rank = values
+        prefix, (last, desc) = self.ordering[:-1], self.ordering[-1]
+        lookup = 'lt' if desc != reverse else 'gt'
+        condition = Q()
+        for i, (name, _) in enumerate(prefix):
+            term = Q(**{f'{name}__{lookup}': values[i]})
+            for j, (prev_name, _) in enumerate(prefix[:i]):
+                term &= Q(**{prev_name: values[j]})
+            condition |= term
+        tied = Q(**{name: values[i] for i, (name, _) in enumerate(prefix)})
+        part_rank = self.ranks[queryset.model]
+        if part_rank == rank:
+            condition |= tied & Q(**{f'{last}__{lookup}': values[-1]})
+        elif (part_rank < rank) == (lookup == 'lt'):
+            condition |= tied
+        return condition
+
+    def _sort_key(self, obj):
+        values = self._values(obj)
+        values.insert(-1, self.ranks[type(obj)])
+        return tuple(values)
+
+    def _merge(self, parts, reverse, limit):
+        descending = self.ordering[0][1] != reverse
+        return list(islice(heapq.merge(*parts, key=self._sort_key, reverse=descending), limit))
+
+    def _fetch(self, condition, reverse, limit):
+        parts = [list(self._slice(queryset, condition and self._part_seek(queryset, *condition), reverse, limit))
+                 for queryset in self.querysets]
+        return self._merge(parts, reverse, limit)
+
+    async def _afetch(self, condition, reverse, limit):
+        async def fetch_part(queryset):
+            part_condition = condition and self._part_seek(queryset, *condition)
+            return [obj async for obj in self._slice(queryset, part_condition, reverse, limit)]
+
+        parts = await asyncio.gather(*(fetch_part(queryset) for queryset in self.querysets))
+        return self._merge(parts, reverse, limit)
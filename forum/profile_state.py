@@ -0,0 +1,84 @@
+import time
+import uuid
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .db_router import primary_reads
+from .models import Profile, UserActivity
+
+# The display fields of the logged in user's profile are kept in the session,
+# stamped with a per-user version from the shared cache. Any save or delete of
+# the profile replaces the version, so every session of that user reloads its
+# snapshot once instead of querying the profile on each request.
+SESSION_KEY = 'forum_profile'
+FIELDS = ('id', 'first_name', 'last_name', 'filled')
+
+LAST_SEEN_KEY = 'forum_last_seen'
+# UserActivity.last_seen_at is written at most once per interval and session.
+LAST_SEEN_INTERVAL = 5 * 60
+
+
+def _version_key(user_id):
+    return f'forum:version:profile:{user_id}'
+
+
+def bump_profile_version(user_id):
+    cache.set(_version_key(user_id), uuid.uuid4().hex[:12], None)
+
+
+def _current_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex[:12]
+        if not cache.add(key, version, None):
+            version = cache.get(key)
+    return version
+
+
+class ProfileState:
+
+    def __init__(self, id=None, first_name=None, last_name=None, filled=False):
+        self.id = id
+        self.first_name = first_name
+        self.last_name = last_name
+        self.filled = filled
+
+    @property
+    def exists(self):
+        return self.id is not None
+
+    def get_absolute_url(self):
+        return Profile(id=self.id).get_absolute_url() if self.exists else None
+
+
+def _store(request, user_id, version, values):
+    request.session[SESSION_KEY] = {'user_id': user_id, 'version': version, **values}
+    return ProfileState(**values)
+
+
+def get_profile_state(request):
+    user_id = request.user.id
+    version = _current_version(user_id)
+    snapshot = request.session.get(SESSION_KEY)
+    if snapshot and snapshot['user_id'] == user_id and snapshot['version'] == version:
+        return ProfileState(**{field: snapshot.get(field) for field in FIELDS})
+    with primary_reads():
+        values = Profile.objects.filter(user_id=user_id).values(*FIELDS).first() or {}
+    return _store(request, user_id, version, values)
+
+
+def remember_profile(request, profile):
+    """Refresh the session snapshot right after the user saved their own profile."""
+    return _store(request, profile.user_id, _current_version(profile.user_id),
+                  {field: getattr(profile, field) for field in FIELDS})
+
+
+def record_last_seen(request):
+    now = time.time()
+    if now - request.session.get(LAST_SEEN_KEY, 0) < LAST_SEEN_INTERVAL:
+        return
+    request.session[LAST_SEEN_KEY] = now
+    if not UserActivity.objects.filter(user_id=request.user.id).update(last_seen_at=timezone.now()):
+        UserActivity.objects.get_or_create(user_id=request.user.id, defaults={'last_seen_at': timezone.now()})
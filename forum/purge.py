@@ -0,0 +1,99 @@
+from collections import Counter
+
+from django.db import connection
+from django.utils import timezone
+
+from . import counters, notifications, search, tasks, writer
+from .models import Topic, Post, Comment, Like, UserActivity, Subscription, Notification
+
+BATCH_SIZE = 500
+
+
+def _delete_rows(model, pks):
+    # Plain DELETE by primary key: no collector, no signals, nothing loaded into memory.
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({", ".join(["%s"] * len(pks))})', pks)
+        return cursor.rowcount
+
+
+def soft_delete_topic(topic):
+    """Hide ``topic`` with everything in it, the rows are removed later by ``purge_deleted``."""
+    topic.deleted_at = timezone.now()
+    topic.save(update_fields=['deleted_at'])
+    tasks.topic_deleted(topic)
+
+
+def soft_delete_post(post):
+    """Hide ``post`` and its comments, the rows are removed later by ``purge_deleted``."""
+    post.deleted_at = timezone.now()
+    post.save(update_fields=['deleted_at'])
+    tasks.post_deleted(post)
+
+
+class Purger:
+    """
+    Hard-deletes soft-deleted topics and posts with their comments, likes and
+    notifications (and the subscriptions of topics),
+    run by the ``purge_deleted`` job or command.
+
+    Rows are removed children first with plain DELETE statements of at most
+    ``batch_size`` primary keys, every batch in its own short write transaction
+    (through ``forum.writer``), so purging a huge thread never holds the write
+    lock for long. An interrupted purge simply continues on the next run.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.stats = Counter()
+        self.user_ids = set()
+        self.notified_ids = set()
+
+    def run(self):
+        for topic_id, author_id in list(Topic.all_objects.filter(deleted_at__isnull=False)
+                                        .values_list('id', 'author_id')):
+            self.purge_posts(Post.all_objects.filter(topic_id=topic_id))
+            writer.write(self._delete_topic, topic_id)
+            self.user_ids.add(author_id)
+        self.purge_posts(Post.all_objects.filter(deleted_at__isnull=False))
+        if self.user_ids or self.notified_ids:
+            writer.write(counters.recount_user_activity, self.user_ids | self.notified_ids)
+            notifications.unread_changed(self.notified_ids)
+        return self.stats
+
+    def purge_posts(self, posts):
+        while batch := list(posts.values_list('id', 'author_id').order_by('id')[:self.batch_size]):
+            post_ids = [post_id for post_id, _ in batch]
+            likes = Like.objects.filter(post_id__in=post_ids)
+            while like_ids := list(likes.values_list('id', flat=True).order_by('id')[:self.batch_size]):
+                self.stats['likes'] += writer.write(_delete_rows, Like, like_ids)
+            notified = Notification.objects.filter(post_id__in=post_ids)
+            while rows := list(notified.values_list('id', 'user_id').order_by('id')[:self.batch_size]):
+                self.stats['notifications'] += writer.write(_delete_rows, Notification, [pk for pk, _ in rows])
+                self.notified_ids.update(user_id for _, user_id in rows)
+            comments = Comment.objects.filter(post_id__in=post_ids)
+            while comment_batch := list(comments.values_list('id', 'author_id').order_by('id')[:self.batch_size]):
+                writer.write(self._delete_comments, [comment_id for comment_id, _ in comment_batch])
+                self.user_ids.update(author_id for _, author_id in comment_batch)
+            writer.write(self._delete_posts, post_ids)
+            self.user_ids.update(author_id for _, author_id in batch)
+
+    def _delete_comments(self, comment_ids):
+        self.stats['comments'] += _delete_rows(Comment, comment_ids)
+        search.remove_documents(comment_ids=comment_ids)
+
+    def _delete_posts(self, post_ids):
+        UserActivity.objects.filter(last_post__in=post_ids).update(last_post=None)
+        self.stats['posts'] += _delete_rows(Post, post_ids)
+        search.remove_documents(post_ids=post_ids)
+
+    def _delete_topic(self, topic_id):
+        # A post that slipped in while the topic was being purged keeps it for the next run.
+        if not Post.all_objects.filter(topic_id=topic_id).exists():
+            Subscription.objects.filter(topic_id=topic_id).delete()
+            self.stats['topics'] += _delete_rows(Topic, [topic_id])
+
+
+def purge_deleted(batch_size=BATCH_SIZE):
+    return Purger(batch_size).run()
@@ -0,0 +1,124 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import db_router, writer
+from .models import RateLimitCounter
+
+# Stores whose incr is one atomic operation that keeps the expiry of the key.
+# Others (locmem, file, database) read and write back, so counts of concurrent
+# processes would get lost and the limit multiplied by the number of processes;
+# with those the counters are kept in the database instead (RateLimitCounter),
+# incremented in place with F().
+ATOMIC_INCR_BACKENDS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+
+def _key(scope, client, window):
+    return f'forum:ratelimit:{scope}:{client}:{window}'
+
+
+def _rejected_key(scope):
+    return f'forum:ratelimit:rejected:{scope}'
+
+
+def _atomic_incr():
+    store = caches[DEFAULT_CACHE_ALIAS]
+    store = getattr(store, 'l2', store)  # The shared tier behind forum.cache_backends.TieredCache.
+    return f'{type(store).__module__}.{type(store).__qualname__}' in ATOMIC_INCR_BACKENDS
+
+
+def _get_many(keys):
+    if _atomic_incr():
+        return cache.get_many(keys)
+    with db_router.primary_reads():
+        return dict(RateLimitCounter.objects.filter(key__in=keys).values_list('key', 'count'))
+
+
+def _add(key, delta, timeout):
+    """Add ``delta`` to the counter at ``key``, created with ``timeout``, and return the new value."""
+    if _atomic_incr():
+        cache.add(key, 0, timeout)
+        try:
+            return cache.incr(key, delta)
+        except ValueError:
+            # Expired between the add and the incr.
+            cache.set(key, delta, timeout)
+            return delta
+    expires_at = None if timeout is None else timezone.now() + timedelta(seconds=timeout)
+    return writer.write(_add_row, key, delta, expires_at)
+
+
+def _add_row(key, delta, expires_at):
+    counters = RateLimitCounter.objects.filter(key=key)
+    if not counters.update(count=F('count') + delta):
+        try:
+            with transaction.atomic():
+                RateLimitCounter.objects.create(key=key, count=delta, expires_at=expires_at)
+        except IntegrityError:
+            # Created by another process in the meantime.
+            counters.update(count=F('count') + delta)
+        else:
+            # A new window: drop the counters of the ended ones.
+            RateLimitCounter.objects.filter(expires_at__lt=timezone.now()).delete()
+    return counters.values_list('count', flat=True).get()
+
+
+def get_limit(scope):
+    """``(requests, seconds)`` configured for ``scope`` in ``FORUM_RATE_LIMITS``, or None."""
+    return getattr(settings, 'FORUM_RATE_LIMITS', {}).get(scope)
+
+
+def client_id(request):
+    # The user id straight from the session, without loading the user; the address for anonymous clients.
+    user_id = request.session.get(SESSION_KEY) if hasattr(request, 'session') else None
+    return f'user:{user_id}' if user_id else f'ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def hit(scope, client, limit, period, now=None):
+    """
+    Count one request of ``client`` against ``limit`` requests per ``period``
+    seconds. Returns None when it is allowed, otherwise the number of seconds
+    to wait.
+
+    A sliding window approximated by two fixed windows: the count of the
+    previous one weighs as much as the part of it still inside the window.
+    A client over the limit is turned away after one read. An allowed
+    request also increments the counter of its window, which is kept until
+    the next window ends.
+    """
+    now = time.time() if now is None else now
+    window, offset = divmod(now, period)
+    window = int(window)
+    current_key, previous_key = _key(scope, client, window), _key(scope, client, window - 1)
+    counts = _get_many([current_key, previous_key])
+    previous = counts.get(previous_key, 0) * (1 - offset / period)
+    if previous + counts.get(current_key, 0) >= limit:
+        return _reject(scope, period - offset)
+    timeout = max(int(2 * period - offset), 1)
+    if previous + _add(current_key, 1, timeout) > limit:
+        # Lost a race with concurrent requests of the same client.
+        _add(current_key, -1, timeout)
+        return _reject(scope, period - offset)
+    return None
+
+
+def _reject(scope, retry_after):
+    _add(_rejected_key(scope), 1, None)
+    return max(int(retry_after), 1)
+
+
+def rejections():
+    """Rejected requests per scope since the counters were created, for monitoring."""
+    scopes = list(getattr(settings, 'FORUM_RATE_LIMITS', {}))
+    counts = _get_many([_rejected_key(scope) for scope in scopes])
+    return {scope: counts.get(_rejected_key(scope), 0) for scope in scopes}
@@ -0,0 +1,219 @@
+import re
+
+from django.db import connection, connections, router
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Topic, Post, Comment
+
+
+# Topics, posts and comments share one index table. Every document gets a rowid
+# derived from its kind and id, so single documents can be replaced or removed
+# through the primary key instead of scanning the index.
+KIND_TOPIC, KIND_POST, KIND_COMMENT = 1, 2, 3
+KIND_NAMES = {KIND_TOPIC: 'topic', KIND_POST: 'post', KIND_COMMENT: 'comment'}
+
+INDEX_TABLE = 'forum_search_index'
+BATCH_SIZE = 1000
+
+# Snippet highlight markers, replaced by <mark> after the snippet is escaped.
+MARK_START, MARK_END = '\x02', '\x03'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _doc_id(kind, object_id):
+    return object_id * 4 + kind
+
+
+def _highlight(snippet):
+    html = escape(snippet or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    return mark_safe(html)
+
+
+class SQLiteSearchBackend:
+    """SQLite FTS5 index ranked with bm25, titles weigh ten times more than content."""
+
+    def create_schema(self, cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {INDEX_TABLE} USING fts5("
+            "kind UNINDEXED, object_id UNINDEXED, topic_id UNINDEXED, title, content, "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+
+    def drop_schema(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {INDEX_TABLE}')
+
+    def add(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT OR REPLACE INTO {INDEX_TABLE}(rowid, kind, object_id, topic_id, title, content) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            [(_doc_id(kind, object_id), kind, object_id, topic_id, title, content)
+             for kind, object_id, topic_id, title, content in rows],
+        )
+
+    def remove(self, cursor, doc_ids):
+        cursor.executemany(f'DELETE FROM {INDEX_TABLE} WHERE rowid = %s', [(doc_id,) for doc_id in doc_ids])
+
+    def clear(self, cursor):
+        cursor.execute(f'DELETE FROM {INDEX_TABLE}')
+
+    def query(self, cursor, words, limit, offset):
+        match = ' '.join('"%s"*' % word for word in words)
+        cursor.execute(
+            f"SELECT kind, object_id, topic_id, "
+            f"snippet({INDEX_TABLE}, 4, char(2), char(3), '…', 24) "
+            f"FROM {INDEX_TABLE} WHERE {INDEX_TABLE} MATCH %s "
+            f"ORDER BY bm25({INDEX_TABLE}, 0, 0, 0, 10.0, 1.0) LIMIT %s OFFSET %s",
+            [match, limit, offset],
+        )
+        return cursor.fetchall()
+
+
+class PostgresSearchBackend:
+    """Postgres table with a generated, GIN-indexed tsvector ranked with ts_rank_cd."""
+
+    def create_schema(self, cursor):
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {INDEX_TABLE} ("
+            "id bigint PRIMARY KEY, kind smallint NOT NULL, object_id bigint NOT NULL, "
+            "topic_id bigint NOT NULL, title text NOT NULL, content text NOT NULL, "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', content), 'B')"
+            ") STORED)"
+        )
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {INDEX_TABLE}_document ON {INDEX_TABLE} USING GIN (document)')
+
+    def drop_schema(self, cursor):
+        cursor.execute(f'DROP TABLE IF EXISTS {INDEX_TABLE}')
+
+    def add(self, cursor, rows):
+        cursor.executemany(
+            f'INSERT INTO {INDEX_TABLE}(id, kind, object_id, topic_id, title, content) '
+            'VALUES (%s, %s, %s, %s, %s, %s) '
+            'ON CONFLICT (id) DO UPDATE SET title = EXCLUDED.title, content = EXCLUDED.content',
+            [(_doc_id(kind, object_id), kind, object_id, topic_id, title, content)
+             for kind, object_id, topic_id, title, content in rows],
+        )
+
+    def remove(self, cursor, doc_ids):
+        cursor.execute(f'DELETE FROM {INDEX_TABLE} WHERE id = ANY(%s)', [list(doc_ids)])
+
+    def clear(self, cursor):
+        cursor.execute(f'TRUNCATE {INDEX_TABLE}')
+
+    def query(self, cursor, words, limit, offset):
+        tsquery = ' & '.join(f'{word}:*' for word in words)
+        cursor.execute(
+            f"SELECT kind, object_id, topic_id, "
+            f"ts_headline('simple', content, q, 'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', MaxWords=24') "
+            f"FROM {INDEX_TABLE}, to_tsquery('simple', %s) q WHERE document @@ q "
+            f"ORDER BY ts_rank_cd(document, q) DESC, id DESC LIMIT %s OFFSET %s",
+            [tsquery, limit, offset],
+        )
+        return cursor.fetchall()
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(vendor=None):
+    backend_class = BACKENDS.get(vendor or connection.vendor)
+    return backend_class() if backend_class else None
+
+
+def _write(rows=(), doc_ids=()):
+    backend = get_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        if doc_ids:
+            backend.remove(cursor, doc_ids)
+        if rows:
+            backend.add(cursor, rows)
+
+
+def index_topic(topic):
+    _write(rows=[(KIND_TOPIC, topic.id, topic.id, topic.title, topic.content)])
+
+
+def index_post(post):
+    _write(rows=[(KIND_POST, post.id, post.topic_id, '', post.content)])
+
+
+def index_comment(comment, topic_id):
+    _write(rows=[(KIND_COMMENT, comment.id, topic_id, '', comment.content)])
+
+
+def remove_documents(topic_ids=(), post_ids=(), comment_ids=()):
+    doc_ids = [_doc_id(KIND_TOPIC, object_id) for object_id in topic_ids]
+    doc_ids += [_doc_id(KIND_POST, object_id) for object_id in post_ids]
+    doc_ids += [_doc_id(KIND_COMMENT, object_id) for object_id in comment_ids]
+    for start in range(0, len(doc_ids), BATCH_SIZE):
+        _write(doc_ids=doc_ids[start:start + BATCH_SIZE])
+
+
+def rebuild_index(batch_size=BATCH_SIZE):
+    """Clear the index and refill it from the database in batches, returns the number of documents."""
+    backend = get_backend()
+    if backend is None:
+        return 0
+    sources = [
+        Topic.objects.values_list('id', 'title', 'content').order_by(),
+        Post.objects.filter(topic__deleted_at__isnull=True).values_list('id', 'topic_id', 'content').order_by(),
+        Comment.objects.filter(post__deleted_at__isnull=True, post__topic__deleted_at__isnull=True)
+        .values_list('id', 'post__topic_id', 'content').order_by(),
+    ]
+    total = 0
+    with connection.cursor() as cursor:
+        backend.clear(cursor)
+        for kind, queryset in zip((KIND_TOPIC, KIND_POST, KIND_COMMENT), sources):
+            batch = []
+            for values in queryset.iterator(chunk_size=batch_size):
+                if kind == KIND_TOPIC:
+                    object_id, title, content = values
+                    batch.append((kind, object_id, object_id, title, content))
+                else:
+                    object_id, topic_id, content = values
+                    batch.append((kind, object_id, topic_id, '', content))
+                if len(batch) >= batch_size:
+                    backend.add(cursor, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                backend.add(cursor, batch)
+                total += len(batch)
+    return total
+
+
+def search(query, page=1, per_page=20):
+    """
+    Return ``(results, has_next)`` for the given page of ranked matches.
+    Each result is a dict with the kind, the topic and a highlighted snippet.
+    """
+    words = WORD_RE.findall(query or '')[:10]
+    backend = get_backend()
+    if not words:
+        return [], False
+
+    offset = (page - 1) * per_page
+    if backend is None:
+        topics = Topic.objects.filter(title__icontains=' '.join(words)).order_by('-id')[offset:offset + per_page + 1]
+        rows = [(KIND_TOPIC, topic.id, topic.id, topic.content[:200]) for topic in topics]
+    else:
+        # Raw SQL bypasses the routers, so pick the read database the topics come from.
+        with connections[router.db_for_read(Topic)].cursor() as cursor:
+            rows = backend.query(cursor, words, per_page + 1, offset)
+
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    topics = Topic.objects.in_bulk({row[2] for row in rows})
+    results = [
+        {'kind': KIND_NAMES[kind], 'object_id': object_id, 'topic': topics[topic_id], 'snippet': _highlight(snippet)}
+        for kind, object_id, topic_id, snippet in rows
+        if topic_id in topics
+    ]
+    return results, has_next
@@ -0,0 +1,100 @@
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .fragments import AUTHOR_FIELDS, bump_post_versions, bump_author_versions
+from .models import Category, SubCategory, Topic, Post, Comment, Profile
+from .page_cache import bump_page_groups
+from .profile_state import bump_profile_version
+from .taxonomy import registry
+
+# The caches are invalidated once the change is committed. Bumped any earlier, a
+# concurrent request could still read the old rows and cache them under the new version.
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+def invalidate_taxonomy(sender, **kwargs):
+    transaction.on_commit(registry.invalidate)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_pages(sender, instance, **kwargs):
+    slug = instance.slug
+    transaction.on_commit(lambda: bump_page_groups('homepage', f'category:{slug}'))
+
+
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+def invalidate_subcategory_pages(sender, instance, **kwargs):
+    groups = ('homepage', f'category:{instance.category_slug}', f'subcategory:{instance.slug}')
+    transaction.on_commit(lambda: bump_page_groups(*groups))
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def invalidate_topic_listings(sender, instance, **kwargs):
+    groups = (f'category:{instance.category_slug}', f'subcategory:{instance.subcategory_slug}')
+    transaction.on_commit(lambda: bump_page_groups(*groups))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_listings(sender, instance, **kwargs):
+    # Post counts and last activity are shown in the listings of the topic.
+    slug_path = Topic.objects.filter(pk=instance.topic_id).values_list('slug_path', flat=True).first()
+    if slug_path:
+        category_slug, subcategory_slug = slug_path.split('/')
+        transaction.on_commit(lambda: bump_page_groups(f'category:{category_slug}', f'subcategory:{subcategory_slug}'))
+
+
+@receiver(post_save, sender=Post)
+def invalidate_post_fragment(sender, instance, **kwargs):
+    post_id = instance.id
+    transaction.on_commit(lambda: bump_post_versions([post_id]))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_post_fragment(sender, instance, **kwargs):
+    post_id = instance.post_id
+    transaction.on_commit(lambda: bump_post_versions([post_id]))
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_profile_state(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_profile_version(user_id))
+
+
+@receiver(pre_save, sender=Profile)
+def remember_author_fields(sender, instance, **kwargs):
+    instance._saved_author_fields = Profile.objects.filter(pk=instance.pk).values_list(*AUTHOR_FIELDS).first() \
+        if instance.pk else None
+
+
+@receiver(post_save, sender=Profile)
+def invalidate_profile_fragments(sender, instance, created, **kwargs):
+    # Post blocks only show the author fields, other profile changes keep them.
+    if created or instance._saved_author_fields != tuple(getattr(instance, field) for field in AUTHOR_FIELDS):
+        user_id = instance.user_id
+        transaction.on_commit(lambda: bump_author_versions([user_id]))
+
+
+@receiver(post_delete, sender=Profile)
+def invalidate_deleted_profile_fragments(sender, instance, **kwargs):
+    user_id = instance.user_id
+    transaction.on_commit(lambda: bump_author_versions([user_id]))
+
+
+@receiver(user_logged_in)
+@receiver(user_logged_out)
+def invalidate_user_pages(sender, user, **kwargs):
+    # Cached pages of the user carry CSRF tokens in their forms, and login rotates the token.
+    if user is not None:
+        bump_page_groups(f'user:{user.id}')
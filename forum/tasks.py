@@ -0,0 +1,111 @@
+from django.db import transaction
+
+from . import counters, search
+from .fragments import bump_post_versions
+from .jobs import job, enqueue_many
+from .models import Topic, Post, Comment
+from .page_cache import bump_page_groups
+
+
+# Job handlers. They recompute from the source rows rather than apply deltas,
+# so running one twice or out of order is harmless, and the key of each job
+# collapses a burst of changes to one topic or user into a single run.
+
+@job('recount_topic')
+def recount_topic(topic_id):
+    counters.recount_topics(Topic.objects.filter(pk=topic_id))
+    slug_path = Topic.objects.filter(pk=topic_id).values_list('slug_path', flat=True).first()
+    if slug_path:
+        category_slug, subcategory_slug = slug_path.split('/')
+        transaction.on_commit(lambda: bump_page_groups(f'category:{category_slug}', f'subcategory:{subcategory_slug}'))
+
+
+@job('recount_post')
+def recount_post(post_id):
+    """Comment counter of the post and, as comments are counted there too, the counters of its topic."""
+    counters.recount_post_comments(Post.objects.filter(pk=post_id))
+    topic_id = Post.objects.filter(pk=post_id).values_list('topic_id', flat=True).first()
+    if topic_id:
+        recount_topic(topic_id)
+    transaction.on_commit(lambda: bump_post_versions([post_id]))
+
+
+@job('recount_activity')
+def recount_activity(user_id):
+    counters.recount_user_activity([user_id])
+
+
+@job('index_topic')
+def index_topic(topic_id):
+    topic = Topic.objects.filter(pk=topic_id).first()
+    if topic:
+        search.index_topic(topic)
+
+
+@job('index_post')
+def index_post(post_id):
+    post = Post.objects.filter(pk=post_id, topic__deleted_at__isnull=True).first()
+    if post:
+        search.index_post(post)
+
+
+@job('index_comment')
+def index_comment(comment_id):
+    comment = Comment.objects.filter(pk=comment_id, post__deleted_at__isnull=True,
+                                     post__topic__deleted_at__isnull=True).select_related('post').first()
+    if comment:
+        search.index_comment(comment, comment.post.topic_id)
+
+
+@job('remove_documents')
+def remove_documents(topic_ids=(), post_ids=(), comment_ids=()):
+    search.remove_documents(topic_ids, post_ids, comment_ids)
+
+
+@job('fan_out_post', atomic=False)
+def fan_out_post(post_id):
+    from .notifications import fan_out
+    fan_out(post_id)
+
+
+@job('purge_deleted', max_attempts=10, atomic=False)
+def purge_deleted():
+    from .purge import purge_deleted
+    purge_deleted()
+
+
+# What the views queue after each write, inside its transaction.
+
+def _recount(name, object_id):
+    field = {'recount_topic': 'topic_id', 'recount_post': 'post_id', 'recount_activity': 'user_id'}[name]
+    return name, {field: object_id}, f'{name}:{object_id}'
+
+
+def topic_created(topic):
+    enqueue_many([_recount('recount_activity', topic.author_id), ('index_topic', {'topic_id': topic.id}, None)])
+
+
+def post_created(post):
+    enqueue_many([_recount('recount_topic', post.topic_id), _recount('recount_activity', post.author_id),
+                  ('index_post', {'post_id': post.id}, None), ('fan_out_post', {'post_id': post.id}, None)])
+
+
+def comment_created(comment):
+    enqueue_many([_recount('recount_post', comment.post_id), _recount('recount_activity', comment.author_id),
+                  ('index_comment', {'comment_id': comment.id}, None)])
+
+
+def comment_deleted(comment):
+    enqueue_many([_recount('recount_post', comment.post_id), _recount('recount_activity', comment.author_id),
+                  ('remove_documents', {'comment_ids': [comment.id]}, None)])
+
+
+def post_deleted(post):
+    # Comments, likes and the activity of commenters are dealt with by the purge.
+    enqueue_many([_recount('recount_topic', post.topic_id), _recount('recount_activity', post.author_id),
+                  ('remove_documents', {'post_ids': [post.id]}, None), ('purge_deleted', None, 'purge_deleted')])
+
+
+def topic_deleted(topic):
+    enqueue_many([_recount('recount_activity', topic.author_id), ('remove_documents', {'topic_ids': [topic.id]}, None),
+                  ('purge_deleted', None, 'purge_deleted')])
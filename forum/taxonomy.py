@@ -0,0 +1,105 @@
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.http import Http404
+
+from .db_router import primary_reads
+from .models import Category, SubCategory
+
+
+class TaxonomyRegistry:
+    """
+    Per-process copy of the Category/SubCategory tree.
+
+    The tree is loaded once and shared by all requests of the worker. Every
+    write bumps a version key in the shared cache; workers compare their copy
+    against it at most once per ``check_interval`` seconds and reload when it
+    changed, so slug lookups normally cost no database query at all.
+    """
+
+    version_key = 'forum:version:taxonomy'
+    check_interval = 1.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tree = None
+        self._checked_at = 0.0
+
+    def invalidate(self):
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+        self._tree = None
+
+    def _shared_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(self.version_key, version, None):
+                version = cache.get(self.version_key)
+        return version
+
+    def _load(self, version):
+        categories = list(Category.objects.order_by('id'))
+        by_id = {category.id: category for category in categories}
+        for category in categories:
+            category.subcategories = []
+        subcategories = list(SubCategory.objects.order_by('id'))
+        for subcategory in subcategories:
+            subcategory.category = by_id[subcategory.category_id]
+            subcategory.category.subcategories.append(subcategory)
+        return {
+            'version': version,
+            'categories': categories,
+            'categories_by_slug': {category.slug: category for category in categories},
+            'subcategories_by_slug': {subcategory.slug: subcategory for subcategory in subcategories},
+        }
+
+    def _get_tree(self):
+        tree = self._tree
+        now = time.monotonic()
+        if tree is not None and now - self._checked_at < self.check_interval:
+            return tree
+        with self._lock:
+            version = self._shared_version()
+            self._checked_at = now
+            if self._tree is None or self._tree['version'] != version:
+                # Kept until the next bump, so never loaded from a lagging replica.
+                with primary_reads():
+                    self._tree = self._load(version)
+            return self._tree
+
+    def categories(self):
+        return self._get_tree()['categories']
+
+    def get_category(self, slug):
+        return self._get_tree()['categories_by_slug'].get(slug)
+
+    def get_subcategory(self, slug, category_slug=None):
+        subcategory = self._get_tree()['subcategories_by_slug'].get(slug)
+        if subcategory is None or (category_slug is not None and subcategory.category.slug != category_slug):
+            return None
+        return subcategory
+
+    def get_category_or_404(self, slug):
+        category = self.get_category(slug)
+        if category is None:
+            raise Http404('Категорію не знайдено')
+        return category
+
+    def get_subcategory_or_404(self, slug, category_slug=None):
+        subcategory = self.get_subcategory(slug, category_slug)
+        if subcategory is None:
+            raise Http404('Підкатегорію не знайдено')
+        return subcategory
+
+    def breadcrumbs(self, category_slug, subcategory_slug=None):
+        category = self.get_category_or_404(category_slug)
+        crumbs = [(category.name, category.get_absolute_url())]
+        if subcategory_slug is not None:
+            subcategory = self.get_subcategory_or_404(subcategory_slug, category_slug)
+            crumbs.append((subcategory.name, subcategory.get_absolute_url()))
+        return crumbs
+
+
+registry = TaxonomyRegistry()
@@ -1,3 +1,342 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import OperationalError
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.views import View
+
+from . import db_router, purge, ratelimit
+from .counters import recount_topics, recount_user_activity
+from .likes import LikeCounterBuffer
+from .middleware import ReplicaRoutingMiddleware
+from .models import Category, Comment, Like, Post, SubCategory, Topic, UserActivity
+from .pagination import KeysetPaginator, MergedKeysetPaginator
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class ForumTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('author', password='password')
+        cls.other = User.objects.create_user('reader', password='password')
+        category = Category.objects.create(name='Загальне', slug='general')
+        cls.subcategory = SubCategory.objects.create(category=category, name='Новини', slug='news')
+        cls.other_subcategory = SubCategory.objects.create(category=category, name='Питання', slug='questions')
+        cls.moment = timezone.now().replace(microsecond=0)
+
+    def create_topic(self, subcategory=None, **fields):
+        return Topic.objects.create(title='Тема', content='Текст', subcategory=subcategory or self.subcategory,
+                                    author=self.user, **fields)
+
+    def create_post(self, topic, author=None):
+        return Post.objects.create(topic=topic, author=author or self.user, content='Пост')
+
+
+def walk(paginator):
+    """Every page from the first one on, following the next cursors."""
+    pages = [paginator.get_page()]
+    while pages[-1].has_next():
+        pages.append(paginator.get_page(after=pages[-1].next_cursor))
+    return pages
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class KeysetPaginatorTests(ForumTestCase):
+
+    def setUp(self):
+        # Seven topics sharing two timestamps, so most pages end in the middle of a tie.
+        self.topics = [self.create_topic() for _ in range(7)]
+        for i, topic in enumerate(self.topics):
+            Topic.objects.filter(pk=topic.pk).update(last_activity_at=self.moment - datetime.timedelta(hours=i % 2))
+        self.expected = list(Topic.objects.order_by(*Topic.LISTING_ORDERING).values_list('id', flat=True))
+
+    def test_pages_cover_ties_once(self):
+        pages = walk(KeysetPaginator(Topic.objects.all(), Topic.LISTING_ORDERING, 3))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([topic.id for page in pages for topic in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+        self.assertFalse(pages[-1].has_next())
+
+    def test_last_page_full(self):
+        pages = walk(KeysetPaginator(Topic.objects.all(), Topic.LISTING_ORDERING, 7))
+        self.assertEqual(len(pages), 1)
+        self.assertFalse(pages[0].has_other_pages())
+
+    def test_previous_page(self):
+        paginator = KeysetPaginator(Topic.objects.all(), Topic.LISTING_ORDERING, 3)
+        first, second, last = walk(paginator)
+        self.assertEqual(list(paginator.get_page(before=last.prev_cursor)), list(second))
+        back = paginator.get_page(before=second.prev_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_invalid_cursor_starts_over(self):
+        paginator = KeysetPaginator(Topic.objects.all(), Topic.LISTING_ORDERING, 3)
+        self.assertEqual(list(paginator.get_page(after='not-a-cursor')), list(paginator.get_page()))
+
+    def test_merged_subcategories(self):
+        for i in range(5):
+            topic = self.create_topic(self.other_subcategory)
+            Topic.objects.filter(pk=topic.pk).update(last_activity_at=self.moment - datetime.timedelta(hours=i % 2))
+        parts = [Topic.objects.filter(subcategory=subcategory) for subcategory in (self.subcategory,
+                                                                                   self.other_subcategory)]
+        pages = walk(MergedKeysetPaginator(parts, Topic.LISTING_ORDERING, 4))
+        expected = list(Topic.objects.order_by(*Topic.LISTING_ORDERING).values_list('id', flat=True))
+        self.assertEqual([len(page) for page in pages], [4, 4, 4])
+        self.assertEqual([topic.id for page in pages for topic in page], expected)
+        self.assertFalse(pages[-1].has_next())
+
+    def test_merged_models_tied_on_everything_but_the_key(self):
+        topic = self.topics[0]
+        posts = [self.create_post(topic) for _ in range(3)]
+        comments = [Comment.objects.create(post=posts[0], author=self.user, content='Коментар') for _ in range(3)]
+        Post.objects.update(created_at=self.moment)
+        Comment.objects.update(created_at=self.moment)
+        paginator = MergedKeysetPaginator([Post.objects.all(), Comment.objects.all()], ('-created_at', '-id'), 2)
+        pages = walk(paginator)
+        seen = [(type(obj), obj.id) for page in pages for obj in page]
+        # Ties are ordered by the position of the queryset, then by the key, descending.
+        self.assertEqual(seen, [(Comment, comment.id) for comment in reversed(comments)]
+                         + [(Post, post.id) for post in reversed(posts)])
+        self.assertEqual(list(paginator.get_page(before=pages[-1].prev_cursor)), list(pages[-2]))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RecountTests(ForumTestCase):
+
+    def test_recount_topics(self):
+        topic = self.create_topic()
+        first = self.create_post(topic)
+        last = self.create_post(topic, author=self.other)
+        hidden = self.create_post(topic)
+        Comment.objects.create(post=first, author=self.other, content='Коментар')
+        Comment.objects.create(post=hidden, author=self.other, content='Коментар')
+        Post.objects.filter(pk=first.pk).update(created_at=self.moment - datetime.timedelta(hours=1))
+        Post.objects.filter(pk=last.pk).update(created_at=self.moment)
+        Post.all_objects.filter(pk=hidden.pk).update(created_at=self.moment + datetime.timedelta(hours=1),
+                                                     deleted_at=self.moment)
+        Comment.objects.filter(post=first).update(created_at=self.moment + datetime.timedelta(minutes=5))
+        Topic.objects.filter(pk=topic.pk).update(post_count=40, comment_count=40)
+
+        self.assertEqual(recount_topics(Topic.objects.filter(pk=topic.pk)), 1)
+        topic.refresh_from_db()
+        self.assertEqual((topic.post_count, topic.comment_count), (2, 1))
+        self.assertEqual((topic.last_post_at, topic.last_post_author), (self.moment, self.other))
+        # The comment on the first post is the latest activity, the deleted post does not count.
+        self.assertEqual(topic.last_activity_at, self.moment + datetime.timedelta(minutes=5))
+
+    def test_recount_topics_without_posts(self):
+        topic = self.create_topic()
+        Topic.objects.filter(pk=topic.pk).update(post_count=3, last_post_at=self.moment)
+        recount_topics()
+        topic.refresh_from_db()
+        self.assertEqual((topic.post_count, topic.last_post_at, topic.last_activity_at),
+                         (0, None, topic.created_at))
+
+    def test_recount_user_activity(self):
+        topic = self.create_topic()
+        deleted_topic = self.create_topic()
+        post = self.create_post(topic)
+        self.create_post(deleted_topic)
+        Comment.objects.create(post=post, author=self.user, content='Коментар')
+        Topic.all_objects.filter(pk=deleted_topic.pk).update(deleted_at=self.moment)
+        self.other.last_login = self.moment
+        self.other.save(update_fields=['last_login'])
+
+        self.assertEqual(recount_user_activity([self.user.pk, self.other.pk]), 2)
+        activity = UserActivity.objects.get(user=self.user)
+        self.assertEqual((activity.topic_count, activity.post_count, activity.comment_count), (1, 1, 1))
+        self.assertEqual(activity.last_post_id, post.id)
+        other = UserActivity.objects.get(user=self.other)
+        self.assertEqual((other.post_count, other.last_post, other.last_seen_at), (0, None, self.moment))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PurgeTests(ForumTestCase):
+
+    def test_purge_deleted(self):
+        kept_topic = self.create_topic()
+        kept = self.create_post(kept_topic)
+        deleted_post = self.create_post(kept_topic, author=self.other)
+        deleted_topic = self.create_topic()
+        for post in (self.create_post(deleted_topic), self.create_post(deleted_topic)):
+            Like.objects.create(user=self.other, post=post)
+            Comment.objects.create(post=post, author=self.other, content='Коментар')
+        Comment.objects.create(post=deleted_post, author=self.user, content='Коментар')
+        Like.objects.create(user=self.user, post=kept)
+        purge.soft_delete_post(deleted_post)
+        purge.soft_delete_topic(deleted_topic)
+
+        stats = purge.purge_deleted(batch_size=1)
+        self.assertEqual((stats['topics'], stats['posts'], stats['comments'], stats['likes']), (1, 3, 3, 2))
+        self.assertEqual(list(Topic.all_objects.values_list('id', flat=True)), [kept_topic.id])
+        self.assertEqual(list(Post.all_objects.values_list('id', flat=True)), [kept.id])
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(Like.objects.get().post_id, kept.id)
+        self.assertEqual(UserActivity.objects.get(user=self.other).post_count, 0)
+        self.assertEqual(purge.purge_deleted()['posts'], 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, FORUM_RATE_LIMITS={'create-post': (3, 60)})
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_limit_per_window(self):
+        allowed = [ratelimit.hit('create-post', 'user:1', 3, 60, now=600 + i) for i in range(4)]
+        self.assertEqual(allowed[:3], [None] * 3)
+        self.assertEqual(allowed[3], 57)
+        self.assertIsNone(ratelimit.hit('create-post', 'user:2', 3, 60, now=604))
+        self.assertEqual(ratelimit.rejections(), {'create-post': 1})
+
+    def test_previous_window_weighs_by_overlap(self):
+        for i in range(3):
+            ratelimit.hit('create-post', 'user:1', 3, 60, now=600 + i)
+        # Half way through the next window the full previous one still counts as 1.5 requests.
+        self.assertIsNone(ratelimit.hit('create-post', 'user:1', 3, 60, now=690))
+        self.assertEqual(ratelimit.hit('create-post', 'user:1', 3, 60, now=691), 29)
+        # Both windows later it is forgotten.
+        self.assertIsNone(ratelimit.hit('create-post', 'user:1', 3, 60, now=780))
+
+    def test_rejected_request_is_not_counted(self):
+        for i in range(5):
+            ratelimit.hit('create-post', 'user:1', 3, 60, now=600 + i)
+        self.assertEqual(ratelimit._get_many([ratelimit._key('create-post', 'user:1', 10)]),
+                         {ratelimit._key('create-post', 'user:1', 10): 3})
+
+
+class SessionModel:
+    _meta = mock.Mock(app_label='sessions')
+
+
+@override_settings(FORUM_DB_REPLICAS=['replica'])
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = db_router.ReplicaRouter()
+        self.reads = []
+        view = self.make_view()
+        self.middleware = ReplicaRoutingMiddleware(lambda request: self.respond(request, view))
+
+    def make_view(self):
+        test = self
+
+        class ListingView(View):
+            use_replica = True
+
+            def get(self, request):
+                return test.read_twice(request)
+
+            def post(self, request):
+                db_router.mark_wrote()
+                return test.read_twice(request)
+
+        return ListingView.as_view()
+
+    def respond(self, request, view):
+        self.middleware.process_view(request, view, (), {})
+        return view(request)
+
+    def read_twice(self, request):
+        self.reads.append(self.router.db_for_read(Post))
+        if request.GET.get('write'):
+            self.router.db_for_write(Post)
+        self.reads.append(self.router.db_for_read(Post))
+        self.reads.append(self.router.db_for_read(SessionModel))
+        return HttpResponse()
+
+    def test_replica_until_the_first_write(self):
+        factory = RequestFactory()
+        self.middleware(factory.get('/'))
+        self.middleware(factory.get('/', {'write': 1}))
+        self.assertEqual(self.reads, ['replica', 'replica', 'default', 'replica', 'default', 'default'])
+        self.assertIsNone(db_router.current_state())
+
+    def test_primary_after_writing(self):
+        factory = RequestFactory()
+        response = self.middleware(factory.post('/'))
+        self.assertIn('forum_primary', response.cookies)
+        request = factory.get('/')
+        request.COOKIES['forum_primary'] = '1'
+        self.middleware(request)
+        self.assertEqual(self.reads, ['default'] * 6)
+
+    def test_primary_reads(self):
+        token = db_router.begin_request()
+        try:
+            db_router.choose_replica(db_router.current_state())
+            with db_router.primary_reads():
+                self.assertEqual(self.router.db_for_read(Post), 'default')
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+        finally:
+            db_router.end_request(token)
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class LikeCounterBufferTests(ForumTestCase):
+
+    def setUp(self):
+        topic = self.create_topic()
+        self.first, self.second = self.create_post(topic), self.create_post(topic)
+        self.buffer = LikeCounterBuffer(flush_interval=60)
+
+    def tearDown(self):
+        self.buffer.flush()
+
+    def like_counts(self):
+        return list(Post.objects.order_by('id').values_list('like_count', flat=True))
+
+    def test_flush_sums_deltas(self):
+        for delta in (1, 1, -1, 1):
+            self.buffer.add(self.first.id, delta)
+        self.buffer.add(self.second.id, 1)
+        self.buffer.add(self.second.id, -1)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.like_counts(), [2, 0])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_negative_delta_is_clamped(self):
+        Post.objects.filter(pk=self.first.pk).update(like_count=1)
+        self.buffer.add(self.first.id, -3)
+        self.buffer.add(self.second.id, 2)
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.like_counts(), [0, 2])
+
+    def test_failed_post_is_kept_without_blocking_others(self):
+        update = QuerySet.update
+        failures = []
+
+        def fail_first(queryset, **kwargs):
+            if not failures:
+                failures.append(queryset)
+                raise OperationalError('database is locked')
+            return update(queryset, **kwargs)
+
+        self.buffer.add(self.first.id, 2)
+        self.buffer.add(self.second.id, 1)
+        with mock.patch.object(QuerySet, 'update', fail_first), self.assertLogs('forum.likes', 'WARNING'):
+            self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.like_counts(), [0, 1])
+        self.assertEqual((self.buffer.pending(self.first.id), self.buffer.pending(self.second.id)), (2, 0))
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.like_counts(), [2, 1])
+
+    def test_failed_write_keeps_every_delta(self):
+        self.buffer.add(self.first.id, 1)
+        self.buffer.add(self.second.id, 1)
+        with mock.patch('forum.writer.write', side_effect=OperationalError('disk I/O error')):
+            with self.assertRaises(OperationalError):
+                self.buffer.flush()
+        self.buffer.add(self.first.id, 1)
+        self.assertEqual((self.buffer.pending(self.first.id), self.buffer.pending(self.second.id)), (2, 1))
+        self.buffer.flush()
+        self.assertEqual(self.like_counts(), [2, 1])
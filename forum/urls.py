@@ -1,17 +1,45 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# FORUM_ASYNC_VIEWS routes the read-only listing and topic pages to their async
+# counterparts, meant for deployments served through main/asgi.py.
+if getattr(settings, 'FORUM_ASYNC_VIEWS', False):
+    HomepageView = async_views.AsyncHomepageView
+    CategoryTopicsView = async_views.AsyncCategoryTopicsView
+    SubcategoryTopicsView = async_views.AsyncSubcategoryTopicsView
+    TopicView = async_views.AsyncTopicView
+else:
+    HomepageView = views.HomepageView
+    CategoryTopicsView = views.CategoryTopicsView
+    SubcategoryTopicsView = views.SubcategoryTopicsView
+    TopicView = views.TopicView
 
 
 urlpatterns = [
-     path('', views.HomepageView.as_view(), name='homepage'),
+     path('', HomepageView.as_view(), name='homepage'),
      path('accounts/profile/', views.ProfileView.as_view(), name='my-profile'),
      path('accounts/profile/create_profile/', views.CreateProfileView.as_view(), name='create-profile'),
      path('accounts/profile/update_profile/', views.UpdateProfileView.as_view(), name='update-profile'),
      path('accounts/profile/<int:profile_id>', views.ProfileView.as_view(), name='user-profile'),
-     path('<slug:category_slug>/', views.CategoryTopicsView.as_view(), name='category-topics'),
-     path('<slug:category_slug>/<slug:subcategory_slug>/', views.SubcategoryTopicsView.as_view(), name='subcategory-topics'),
+     path('search/', views.SearchView.as_view(), name='search'),
+     path('profiler/queries/', views.QueryProfileView.as_view(), name='query-profile'),
+     path('export/', views.ExportView.as_view(), name='export'),
+     path('notifications/', views.NotificationsView.as_view(), name='notifications'),
+     path('<slug:category_slug>/', CategoryTopicsView.as_view(), name='category-topics'),
+     path('<slug:category_slug>/<slug:subcategory_slug>/', SubcategoryTopicsView.as_view(), name='subcategory-topics'),
      path('<slug:category_slug>/<slug:subcategory_slug>/create_topic/', views.CreateTopicView.as_view(), name='create-topic'),
-     path('<slug:category_slug>/<slug:subcategory_slug>/<int:topic_id>/', views.TopicView.as_view(), name='topic'),
+     path('<slug:category_slug>/<slug:subcategory_slug>/subscribe/',
+          views.SubscribeView.as_view(), name='subscribe-subcategory'),
+     path('<slug:category_slug>/<slug:subcategory_slug>/unsubscribe/',
+          views.UnsubscribeView.as_view(), name='unsubscribe-subcategory'),
+     path('<slug:category_slug>/<slug:subcategory_slug>/<int:topic_id>/', TopicView.as_view(), name='topic'),
+     path('<slug:category_slug>/<slug:subcategory_slug>/<int:topic_id>/subscribe/',
+          views.SubscribeView.as_view(), name='subscribe-topic'),
+     path('<slug:category_slug>/<slug:subcategory_slug>/<int:topic_id>/unsubscribe/',
+          views.UnsubscribeView.as_view(), name='unsubscribe-topic'),
+     path('<slug:category_slug>/<slug:subcategory_slug>/<int:topic_id>/events/',
+          async_views.TopicEventsView.as_view(), name='topic-events'),
      path('<slug:category_slug>/<slug:subcategory_slug>/<int:topic_id>/create_post/',
           views.CreatePostView.as_view(), name='create-post'),
 
@@ -24,6 +52,18 @@ urlpatterns = [
      path('<slug:category_slug>/<slug:subcategory_slug>/<int:topic_id>/<int:post_id>/delete_post/',
           views.DeletePostView.as_view(), name='delete-post'),
 
+     path('<slug:category_slug>/<slug:subcategory_slug>/<int:topic_id>/<int:post_id>/comments/',
+          views.PostCommentsView.as_view(), name='post-comments'),
+
+     path('<slug:category_slug>/<slug:subcategory_slug>/<int:topic_id>/<int:post_id>/block/',
+          views.PostBlockView.as_view(), name='post-block'),
+
+     path('<slug:category_slug>/<slug:subcategory_slug>/<int:topic_id>/<int:post_id>/like/',
+          views.LikePostView.as_view(), name='like-post'),
+
+     path('<slug:category_slug>/<slug:subcategory_slug>/<int:topic_id>/<int:post_id>/unlike/',
+          views.UnlikePostView.as_view(), name='unlike-post'),
+
      path('<slug:category_slug>/<slug:subcategory_slug>/<int:topic_id>/<int:post_id>/<int:comment_id>/delete_comment',
           views.DeleteCommentView.as_view(), name='delete-comment'),
 ]
@@ -1,13 +1,20 @@
-from django.shortcuts import get_object_or_404
-from django.views.decorators.cache import cache_page
+from django.contrib.auth.mixins import UserPassesTestMixin
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseBadRequest
+from django.shortcuts import get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.utils.decorators import method_decorator
 from django.urls import reverse
-from django.views.generic import ListView, DetailView, CreateView, DeleteView, UpdateView
-from .models import Topic, Category, SubCategory, Post, Comment, Profile
-from django.db.models import Count
-from django.core.paginator import Paginator
+from django.views.generic import View, ListView, DetailView, CreateView, DeleteView, UpdateView, TemplateView
+from .models import Topic, Category, Post, Comment, Profile, UserActivity, Notification
+from .pagination import KeysetPaginator, MergedKeysetPaginator
+from . import search, likes, exporter, live, writer, purge, tasks, notifications, ratelimit
+from .fragments import render_posts, apply_actions, comment_paginator
+from .page_cache import versioned_cache_page, PAGE_CACHE_TIMEOUT
+from .taxonomy import registry
 from .forms import CreateTopicForm, CreatePostForm, CreateCommentForm, ProfileForm
 from .mixins import ProfileAndLoginRequired, AuthorOrSuperuserPermissionMixin
+from .profile_state import remember_profile
+from .middleware import query_stats
 # Create your views here.
 
 
@@ -15,13 +22,15 @@ class HomepageView(ListView):
     model = Category
     template_name = 'forum/homepage.html'
     context_object_name = 'categories'
+    query_budget = 6
+    use_replica = True
 
-    @method_decorator(cache_page(60*30))
+    @method_decorator(versioned_cache_page(PAGE_CACHE_TIMEOUT, lambda: ['homepage']))
     def dispatch(self, request, *args, **kwargs):
         return super().dispatch(request, *args, **kwargs)
 
     def get_queryset(self):
-        return Category.objects.prefetch_related('subcategory').all()
+        return registry.categories()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -29,31 +38,63 @@ class HomepageView(ListView):
         return context
 
 
-class CategoryTopicsView(ListView):
+class TopicListingMixin:
+    paginate_by = 20
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_paginator(queryset, page_size)
+        page = paginator.get_page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        return KeysetPaginator(queryset, Topic.LISTING_ORDERING, per_page)
+
+
+class CategoryTopicsView(TopicListingMixin, ListView):
     model = Topic
     template_name = 'forum/category-topics.html'
     context_object_name = 'topics'
+    query_budget = 25
+    use_replica = True
+
+    @method_decorator(versioned_cache_page(PAGE_CACHE_TIMEOUT, lambda category_slug: [f'category:{category_slug}']))
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
 
     def get_queryset(self):
-        self.category = get_object_or_404(Category, slug=self.kwargs['category_slug'])
-        return Topic.objects.filter(subcategory__category=self.category).annotate(count_posts=Count('posts'))
+        self.category = registry.get_category_or_404(self.kwargs['category_slug'])
+        self.subcategory_ids = [subcategory.id for subcategory in self.category.subcategories]
+        return Topic.objects.filter(subcategory__category=self.category)
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        # One index range scan per subcategory, merged in order, instead of sorting the whole category.
+        parts = [Topic.objects.filter(subcategory_id=subcategory_id) for subcategory_id in self.subcategory_ids]
+        return MergedKeysetPaginator(parts, Topic.LISTING_ORDERING, per_page)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['title'] = f'Список обговорень {self.category.name}'
         context['category_title'] = self.category.name
+        context['breadcrumbs'] = registry.breadcrumbs(self.category.slug)
         return context
 
 
-class SubcategoryTopicsView(ListView):
+class SubcategoryTopicsView(TopicListingMixin, ListView):
     model = Topic
     template_name = 'forum/category-topics.html'
     context_object_name = 'topics'
+    query_budget = 8
+    use_replica = True
+
+    @method_decorator(versioned_cache_page(PAGE_CACHE_TIMEOUT,
+                                           lambda category_slug, subcategory_slug: [f'subcategory:{subcategory_slug}']))
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
 
     def get_queryset(self):
-        self.category = get_object_or_404(Category, slug=self.kwargs['category_slug'])
-        self.subcategory = get_object_or_404(SubCategory, slug=self.kwargs['subcategory_slug'], category=self.category)
-        return Topic.objects.filter(subcategory=self.subcategory).annotate(count_posts=Count('posts'))
+        self.subcategory = registry.get_subcategory_or_404(self.kwargs['subcategory_slug'], self.kwargs['category_slug'])
+        self.category = self.subcategory.category
+        return Topic.objects.filter(subcategory=self.subcategory)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -61,6 +102,8 @@ class SubcategoryTopicsView(ListView):
         context['category_title'] = self.subcategory.name
         context['category_slug'] = self.category.slug
         context['subcategory_slug'] = self.subcategory.slug
+        context['breadcrumbs'] = registry.breadcrumbs(self.category.slug, self.subcategory.slug)
+        context['subscription'] = notifications.get_subscription(self.request.user, subcategory_id=self.subcategory.id)
         return context
 
 
@@ -68,30 +111,33 @@ class TopicView(DetailView):
     model = Topic
     template_name = 'forum/topicview.html'
     context_object_name = 'topic'
+    paginate_by = 10
+    query_budget = 12
+    use_replica = True
 
     def get_object(self):
-        category_slug = self.kwargs['category_slug']
-        subcategory_slug = self.kwargs['subcategory_slug']
-        return get_object_or_404(Topic, id=self.kwargs['topic_id'],
-                                 subcategory__slug=subcategory_slug,
-                                 subcategory__category__slug=category_slug)
+        subcategory = registry.get_subcategory_or_404(self.kwargs['subcategory_slug'], self.kwargs['category_slug'])
+        return get_object_or_404(Topic.objects.select_related('author__profile'), id=self.kwargs['topic_id'],
+                                 subcategory_id=subcategory.id)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
         topic = context['topic']
+        context['breadcrumbs'] = registry.breadcrumbs(self.kwargs['category_slug'], self.kwargs['subcategory_slug'])
 
-        posts = Post.objects.filter(topic=topic).order_by('-created_at') \
-            .select_related('author__profile') \
-            .prefetch_related('comments__author__profile')
-
-        context['posts'] = posts
+        posts = Post.objects.filter(topic=topic).select_related('author__profile')
 
-        paginator = Paginator(posts, 10)
-        page_number = self.request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        paginator = KeysetPaginator(posts, ('-created_at', '-id'), self.paginate_by)
+        page_obj = paginator.get_page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
 
-        context['page_obj'] = page_obj.object_list
+        context['page_obj'] = page_obj
+        context['posts'] = page_obj.object_list
+        post_ids = [post.id for post in page_obj.object_list]
+        context['post_fragments'] = render_posts(page_obj.object_list, topic, self.request,
+                                                 like_counts=likes.like_counts(page_obj.object_list),
+                                                 liked_ids=likes.liked_post_ids(self.request.user, post_ids))
+        context['subscription'] = notifications.get_subscription(self.request.user, topic_id=topic.id)
 
         return context
 
@@ -100,6 +146,17 @@ class ProfileView(ProfileAndLoginRequired, DetailView):
     model = Profile
     template_name = 'forum/profile.html'
     context_object_name = 'profile'
+    paginate_by = 20
+    query_budget = 12
+    use_replica = True
+
+    # Model, kind, related rows shown with it and the filter hiding items of soft-deleted parents.
+    FEED_KINDS = (
+        (Topic, 'topic', (), {}),
+        (Post, 'post', ('topic',), {'topic__deleted_at__isnull': True}),
+        (Comment, 'comment', ('post__topic',), {'post__deleted_at__isnull': True,
+                                                'post__topic__deleted_at__isnull': True}),
+    )
 
     def get_object(self):
         profile_id = self.kwargs.get('profile_id')
@@ -107,13 +164,26 @@ class ProfileView(ProfileAndLoginRequired, DetailView):
             obj = get_object_or_404(Profile, id=profile_id)
             return obj
         else:
-            return get_object_or_404(Profile, user=self.request.user)
+            return get_object_or_404(Profile, id=self.request.profile_state.id)
+
+    def get_feed(self, user_id):
+        # Topics, posts and comments of the user merged by creation time, each read
+        # with a range scan of its (author, created_at, id) index.
+        parts = [model.objects.filter(author_id=user_id, **visible).select_related(*related)
+                 for model, _, related, visible in self.FEED_KINDS]
+        paginator = MergedKeysetPaginator(parts, ('-created_at', '-id'), self.paginate_by)
+        page = paginator.get_page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        kinds = {model: kind for model, kind, _, _ in self.FEED_KINDS}
+        for item in page.object_list:
+            item.kind = kinds[type(item)]
+        return page
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        user = context['profile'].user
+        user_id = context['profile'].user_id
         context['title'] = 'Профіль користувача'
-        context['user_topics'] = Topic.objects.filter(author=user)
+        context['activity'] = UserActivity.objects.filter(user_id=user_id).select_related('last_post__topic').first()
+        context['page_obj'] = self.get_feed(user_id)
         return context
 
 
@@ -121,13 +191,16 @@ class CreateProfileView(ProfileAndLoginRequired, CreateView):
     model = Profile
     form_class = ProfileForm
     template_name = 'forum/createprofile.html'
+    query_budget = 10
 
     def form_valid(self, form):
         profile = form.save(commit=False)
         profile.user = self.request.user
         profile.filled = True
         profile.save()
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        remember_profile(self.request, self.object)
+        return response
 
     def get_success_url(self):
         return reverse('my-profile')
@@ -137,30 +210,45 @@ class CreateTopicView(ProfileAndLoginRequired, CreateView):
     model = Topic
     form_class = CreateTopicForm
     template_name = 'forum/createtopic.html'
+    query_budget = 12
+    rate_limit = 'create-topic'
 
     def dispatch(self, request, *args, **kwargs):
-        self.subcategory = get_object_or_404(SubCategory, slug=kwargs['subcategory_slug'])
+        self.subcategory = registry.get_subcategory_or_404(kwargs['subcategory_slug'], kwargs['category_slug'])
         return super().dispatch(request, *args, **kwargs)
 
     def form_valid(self, form):
         topic = form.save(commit=False)
         topic.subcategory = self.subcategory
         topic.author = self.request.user
+        self.object = writer.write(self.save_topic, topic)
+        return redirect(self.get_success_url())
+
+    def save_topic(self, topic):
         topic.save()
-        return super().form_valid(form)
+        tasks.topic_created(topic)
+        return topic
 
 
 class CreatePostView(ProfileAndLoginRequired, CreateView):
     model = Post
     form_class = CreatePostForm
     template_name = 'forum/createpost.html'
+    query_budget = 15
+    rate_limit = 'create-post'
 
     def form_valid(self, form):
         post = form.save(commit=False)
         post.author = self.request.user
         post.topic = get_object_or_404(Topic, id=self.kwargs['topic_id'])
+        self.object = writer.write(self.save_post, post)
+        return redirect(self.get_success_url())
+
+    def save_post(self, post):
         post.save()
-        return super().form_valid(form)
+        tasks.post_created(post)
+        live.post_created(post)
+        return post
 
     def get_success_url(self):
         return reverse('topic', kwargs={'category_slug': self.kwargs['category_slug'],
@@ -172,13 +260,21 @@ class CreateCommentView(ProfileAndLoginRequired, CreateView):
     model = Comment
     form_class = CreateCommentForm
     template_name = 'forum/createcomment.html'
+    query_budget = 15
+    rate_limit = 'create-comment'
 
     def form_valid(self, form):
         comment = form.save(commit=False)
         comment.author = self.request.user
-        comment.post = get_object_or_404(Post, id=self.kwargs['post_id'])
+        comment.post = get_object_or_404(Post, id=self.kwargs['post_id'], topic__deleted_at__isnull=True)
+        self.object = writer.write(self.save_comment, comment)
+        return redirect(self.get_success_url())
+
+    def save_comment(self, comment):
         comment.save()
-        return super().form_valid(form)
+        tasks.comment_created(comment)
+        live.comment_created(comment)
+        return comment
 
     def get_success_url(self):
         return reverse('topic', kwargs={'category_slug': self.kwargs['category_slug'],
@@ -190,6 +286,14 @@ class DeletePostView(ProfileAndLoginRequired, AuthorOrSuperuserPermissionMixin,
     model = Post
     template_name = 'forum/deleteform.html'
     id_url_kwarg = 'post_id'
+    query_budget = 20
+
+    def form_valid(self, form):
+        return writer.write(self.delete_post, form)
+
+    def delete_post(self, form):
+        purge.soft_delete_post(self.object)
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse('topic', kwargs={'category_slug': self.kwargs['category_slug'],
@@ -201,6 +305,14 @@ class DeleteCommentView(ProfileAndLoginRequired, AuthorOrSuperuserPermissionMixi
     model = Comment
     template_name = 'forum/deleteform.html'
     id_url_kwarg = 'comment_id'
+    query_budget = 12
+
+    def form_valid(self, form):
+        return writer.write(self.delete_comment, form)
+
+    def delete_comment(self, form):
+        tasks.comment_deleted(self.object)
+        return super().form_valid(form)
 
     def get_success_url(self):
         return reverse('topic', kwargs={'category_slug': self.kwargs['category_slug'],
@@ -212,6 +324,14 @@ class DeleteTopicView(ProfileAndLoginRequired, AuthorOrSuperuserPermissionMixin,
     model = Topic
     template_name = 'forum/deleteform.html'
     id_url_kwarg = 'topic_id'
+    query_budget = 16
+
+    def form_valid(self, form):
+        return writer.write(self.delete_topic, form)
+
+    def delete_topic(self, form):
+        purge.soft_delete_topic(self.object)
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse('subcategory-topics', kwargs={'category_slug': self.kwargs['category_slug'],
@@ -222,9 +342,166 @@ class UpdateProfileView(ProfileAndLoginRequired, UpdateView):
     model = Profile
     template_name = 'forum/update-profile.html'
     form_class = ProfileForm
+    query_budget = 12
 
     def get_object(self):
-        return get_object_or_404(Profile, user=self.request.user)
+        return get_object_or_404(Profile, id=self.request.profile_state.id)
+
+    def form_valid(self, form):
+        response = super().form_valid(form)
+        remember_profile(self.request, self.object)
+        return response
 
     def get_success_url(self):
         return reverse('my-profile')
+
+
+class LikePostView(ProfileAndLoginRequired, View):
+    http_method_names = ['post']
+    liked = True
+    query_budget = 8
+
+    def post(self, request, *args, **kwargs):
+        post = get_object_or_404(Post, id=kwargs['post_id'], topic_id=kwargs['topic_id'])
+        writer.write(likes.like if self.liked else likes.unlike, request.user, post)
+        return redirect('topic', category_slug=kwargs['category_slug'],
+                        subcategory_slug=kwargs['subcategory_slug'], topic_id=kwargs['topic_id'])
+
+
+class UnlikePostView(LikePostView):
+    liked = False
+
+
+class SubscribeView(ProfileAndLoginRequired, View):
+    """Follow (or with ``subscribed = False`` stop following) a subcategory or, with ``topic_id``, a topic."""
+    http_method_names = ['post']
+    subscribed = True
+    query_budget = 12
+
+    def post(self, request, *args, **kwargs):
+        subcategory = registry.get_subcategory_or_404(kwargs['subcategory_slug'], kwargs['category_slug'])
+        if 'topic_id' in kwargs:
+            topic = get_object_or_404(Topic, id=kwargs['topic_id'], subcategory_id=subcategory.id)
+            target, url = {'topic_id': topic.id}, topic.get_absolute_url()
+        else:
+            target, url = {'subcategory_id': subcategory.id}, subcategory.get_absolute_url()
+        if self.subscribed:
+            writer.write(notifications.subscribe, request.user, email_digest='email_digest' in request.POST, **target)
+        else:
+            writer.write(notifications.unsubscribe, request.user, **target)
+        return redirect(url)
+
+
+class UnsubscribeView(SubscribeView):
+    subscribed = False
+
+
+class NotificationsView(ProfileAndLoginRequired, TemplateView):
+    template_name = 'forum/notifications.html'
+    paginate_by = 20
+    query_budget = 8
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        inbox = Notification.objects.filter(user=self.request.user, post__deleted_at__isnull=True,
+                                            post__topic__deleted_at__isnull=True) \
+            .select_related('post__topic', 'post__author__profile')
+        paginator = KeysetPaginator(inbox, ('-created_at', '-id'), self.paginate_by)
+        context['title'] = 'Сповіщення'
+        context['page_obj'] = paginator.get_page(after=self.request.GET.get('after'),
+                                                 before=self.request.GET.get('before'))
+        return context
+
+    def post(self, request, *args, **kwargs):
+        writer.write(notifications.mark_all_read, request.user)
+        return redirect('notifications')
+
+
+class PostCommentsView(View):
+    http_method_names = ['get']
+    query_budget = 5
+    use_replica = True
+
+    def get(self, request, *args, **kwargs):
+        post = get_object_or_404(Post.objects.select_related('author__profile', 'topic'), id=kwargs['post_id'],
+                                 topic_id=kwargs['topic_id'], topic__deleted_at__isnull=True,
+                                 topic__slug_path=f"{kwargs['category_slug']}/{kwargs['subcategory_slug']}")
+        page = comment_paginator(post.id).get_page(after=request.GET.get('after'))
+        html = render_to_string('forum/comment-list.html', {'comments': page.object_list, 'post': post})
+        html, = apply_actions([html], post.topic, request)
+        return JsonResponse({'html': html, 'next': page.next_cursor})
+
+
+class PostBlockView(View):
+    """One post block with the viewer's buttons, fetched by the live topic updates (see forum.live)."""
+    http_method_names = ['get']
+    query_budget = 6
+
+    def get(self, request, *args, **kwargs):
+        post = get_object_or_404(Post.objects.select_related('author__profile', 'topic'), id=kwargs['post_id'],
+                                 topic_id=kwargs['topic_id'], topic__deleted_at__isnull=True,
+                                 topic__slug_path=f"{kwargs['category_slug']}/{kwargs['subcategory_slug']}")
+        html, = render_posts([post], post.topic, request, like_counts=likes.like_counts([post]),
+                             liked_ids=likes.liked_post_ids(request.user, [post.id]))
+        return JsonResponse({'html': html})
+
+
+class SearchView(TemplateView):
+    template_name = 'forum/search.html'
+    paginate_by = 20
+    max_page = 50
+    query_budget = 6
+    use_replica = True
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('q', '').strip()
+        try:
+            page = min(max(int(self.request.GET.get('page', 1)), 1), self.max_page)
+        except ValueError:
+            page = 1
+        results, has_next = search.search(query, page, self.paginate_by)
+        context['title'] = f'Пошук: {query}' if query else 'Пошук'
+        context['query'] = query
+        context['results'] = results
+        context['page'] = page
+        context['next_page'] = page + 1 if has_next and page < self.max_page else None
+        context['previous_page'] = page - 1 if page > 1 else None
+        return context
+
+
+class QueryProfileView(UserPassesTestMixin, View):
+    http_method_names = ['get']
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({'views': query_stats.snapshot(), 'rate_limit_rejections': ratelimit.rejections()},
+                            json_dumps_params={'ensure_ascii': False})
+
+
+class ExportView(UserPassesTestMixin, View):
+    http_method_names = ['get']
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        subcategory = None
+        if request.GET.get('subcategory'):
+            subcategory = registry.get_subcategory_or_404(request.GET['subcategory'])
+        try:
+            topic_id = int(request.GET['topic']) if request.GET.get('topic') else None
+            since = exporter.parse_bound(request.GET.get('since'))
+            until = exporter.parse_bound(request.GET.get('until'), end=True)
+        except ValueError as error:
+            return HttpResponseBadRequest(str(error))
+
+        compress = request.GET.get('gzip') == '1'
+        lines = exporter.export_lines(subcategory, topic_id, since, until)
+        response = StreamingHttpResponse(exporter.encode(lines, compress),
+                                         content_type='application/gzip' if compress else 'application/x-ndjson')
+        filename = 'forum.jsonl.gz' if compress else 'forum.jsonl'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -0,0 +1,78 @@
+import contextvars
+import queue
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from . import db_router
+
+
+class SingleWriter:
+    """
+    Runs write callables one at a time, each in its own transaction, on a
+    dedicated thread with its own (persistent) database connection. Callables
+    run in a copy of the caller's context, so they see its context variables.
+
+    SQLite allows one writer at a time; funnelling the forum's writes through
+    one thread turns lock contention between request threads into an ordered
+    queue, while reads keep running in parallel on the request threads (WAL).
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._work, name='forum-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Run ``fn(*args, **kwargs)`` on the writer thread and return its result or raise its exception."""
+        if threading.current_thread() is self._thread:
+            with transaction.atomic():
+                return fn(*args, **kwargs)
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((future, contextvars.copy_context(), fn, args, kwargs))
+        return future.result()
+
+    def _run(self, fn, args, kwargs):
+        with transaction.atomic():
+            return fn(*args, **kwargs)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            future, context, fn, args, kwargs = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            close_old_connections()
+            try:
+                result = context.run(self._run, fn, args, kwargs)
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+
+single_writer = SingleWriter()
+
+
+def write(fn, *args, **kwargs):
+    """
+    Run the write ``fn(*args, **kwargs)`` in a transaction: on the single writer
+    thread with ``FORUM_SQLITE_WRITE_QUEUE = True``, inline otherwise.
+    """
+    # The rest of the request reads from the primary, wherever the write runs.
+    db_router.mark_wrote()
+    if getattr(settings, 'FORUM_SQLITE_WRITE_QUEUE', False):
+        return single_writer.submit(fn, *args, **kwargs)
+    with transaction.atomic():
+        return fn(*args, **kwargs)
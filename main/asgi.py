@@ -13,4 +13,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "main.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from forum.live import EventStreamRouter  # noqa: E402  (needs the app registry)
+
+application = EventStreamRouter(django_application)
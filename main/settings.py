@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "forum.middleware.ReplicaRoutingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -55,8 +56,38 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",
+    "forum.middleware.RateLimitMiddleware",
+    "forum.middleware.QueryProfilerMiddleware",
 ]
 
+# Per-request SQL profiling with N+1 detection and view query budgets, see forum.middleware.
+FORUM_QUERY_PROFILER = False
+FORUM_N_PLUS_ONE_THRESHOLD = 5
+FORUM_QUERY_BUDGET_RAISE = False
+# Serve listings and topic pages with the async views (for ASGI deployments).
+FORUM_ASYNC_VIEWS = False
+# Pub/sub used by the live topic updates, replace with a shared broker when running several workers.
+FORUM_LIVE_BROKER = 'forum.live.InProcessBroker'
+# Database aliases of read replicas used by the read-only views, see forum.db_router.
+FORUM_DB_REPLICAS = []
+# How long a client reads from the primary after one of its requests wrote.
+FORUM_REPLICA_STICKY_SECONDS = 10
+# Run the forum's writes one at a time on a dedicated thread (see forum.writer).
+FORUM_SQLITE_WRITE_QUEUE = False
+# Deferred work (counters, search index, purges) is queued in the database and
+# done by `manage.py run_forum_worker`; eager mode runs it right after each commit.
+FORUM_JOBS_EAGER = False
+# Absolute address of the forum used for links in digest emails (send_notification_digests).
+FORUM_SITE_URL = 'http://127.0.0.1:8000'
+# (requests, seconds) per user (per address for anonymous clients) of the views
+# declaring `rate_limit`, counted in the cache when it has an atomic incr (Redis, Memcached),
+# otherwise in the database, see forum.ratelimit and forum.middleware.RateLimitMiddleware.
+FORUM_RATE_LIMITS = {
+    'create-topic': (5, 600),
+    'create-post': (10, 60),
+    'create-comment': (20, 60),
+}
+
 ROOT_URLCONF = "main.urls"
 
 TEMPLATES = [
@@ -70,6 +101,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "forum.context_processors.notifications",
             ],
         },
     },
@@ -81,13 +113,35 @@ WSGI_APPLICATION = "main.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# SQLite set up for concurrent requests: WAL lets reads run while a write is in
+# progress, IMMEDIATE transactions take the write lock up front so concurrent
+# writers wait for it (busy_timeout, ms) instead of failing with "database is
+# locked" when upgrading a read lock, and connections are kept between requests.
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; PRAGMA busy_timeout=5000;",
+            "transaction_mode": "IMMEDIATE",
+        },
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# A copy of the database file used as a read replica for local testing, refresh
+# it with e.g. `sqlite3 db.sqlite3 ".backup replica.sqlite3"`.
+if os.environ.get('FORUM_SQLITE_REPLICA'):
+    DATABASES['replica'] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.environ['FORUM_SQLITE_REPLICA'],
+        "TEST": {"MIRROR": "default"},
+    }
+    FORUM_DB_REPLICAS = ['replica']
+
+DATABASE_ROUTERS = ['forum.db_router.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -109,9 +163,17 @@ AUTH_PASSWORD_VALIDATORS = [
 
 CACHES = {
     'default': {
+        'BACKEND': 'forum.cache_backends.TieredCache',
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+        },
+    },
+    'shared': {
         'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
         'LOCATION': BASE_DIR / 'cache',
-    }
+    },
 }
 
 
@@ -0,0 +1,21 @@
+// Loads the comments hidden behind a post's "more comments" button, one page per click.
+document.addEventListener('click', function (event) {
+    const button = event.target.closest('.more-comments button');
+    if (!button) {
+        return;
+    }
+    const block = button.closest('.more-comments');
+    button.disabled = true;
+    fetch(button.dataset.url + '?after=' + encodeURIComponent(block.dataset.after))
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+            block.insertAdjacentHTML('beforebegin', data.html);
+            if (data.next) {
+                block.dataset.after = data.next;
+                button.disabled = false;
+            } else {
+                block.remove();
+            }
+        })
+        .catch(function () { button.disabled = false; });
+});
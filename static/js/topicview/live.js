@@ -0,0 +1,47 @@
+// Live topic updates: new posts are added on the first page, posts that got a
+// new comment are replaced wherever they are shown.
+(function () {
+    const container = document.querySelector('.topic-container[data-events-url]');
+    if (!container || !window.EventSource) {
+        return;
+    }
+    const list = container.querySelector('.posts-list');
+    const source = new EventSource(container.dataset.eventsUrl);
+
+    function toElement(html) {
+        const template = document.createElement('template');
+        template.innerHTML = html.trim();
+        return template.content.firstElementChild;
+    }
+
+    // Events only name the post, its block is fetched with this viewer's buttons.
+    function fetchBlock(data, show) {
+        fetch(data.url)
+            .then(function (response) { return response.json(); })
+            .then(function (block) { show(toElement(block.html)); })
+            .catch(function () {});
+    }
+
+    source.addEventListener('post', function (event) {
+        const data = JSON.parse(event.data);
+        if (container.hasAttribute('data-live-posts') && !document.getElementById('post-' + data.id)) {
+            fetchBlock(data, function (element) {
+                if (!document.getElementById('post-' + data.id)) {
+                    list.prepend(element);
+                }
+            });
+        }
+    });
+
+    source.addEventListener('post-updated', function (event) {
+        const data = JSON.parse(event.data);
+        if (document.getElementById('post-' + data.id)) {
+            fetchBlock(data, function (element) {
+                const current = document.getElementById('post-' + data.id);
+                if (current) {
+                    current.replaceWith(element);
+                }
+            });
+        }
+    });
+})();